@@ -9,6 +9,23 @@ from src.logger import setup_logging, MigrationLogger
 from src.migration_orchestrator import MigrationOrchestrator
 from src.webhook_handler import WebhookHandler
 
+# Command line options that override a configuration value
+CLI_CONFIG_OVERRIDES = {
+    "batch_size": "migration.batch_size",
+    "max_concurrent": "migration.max_concurrent_downloads",
+    "incremental": "migration.incremental",
+}
+
+def positive_int(value: str) -> int:
+    """Parse a command line value as an integer greater than zero."""
+    try:
+        number = int(value)
+    except ValueError:
+        raise argparse.ArgumentTypeError(f"invalid integer: {value!r}")
+    if number < 1:
+        raise argparse.ArgumentTypeError(f"must be at least 1: {number}")
+    return number
+
 def main():
     """Main application entry point."""
     parser = argparse.ArgumentParser(description="Slack Archive Migration Tool")
@@ -25,14 +42,20 @@ def main():
     )
     parser.add_argument(
         "--batch-size",
-        type=int,
+        type=positive_int,
         help="Override batch size for migration"
     )
     parser.add_argument(
         "--max-concurrent",
-        type=int,
+        type=positive_int,
         help="Override max concurrent downloads"
     )
+    parser.add_argument(
+        "--incremental",
+        action="store_true",
+        default=None,
+        help="Only catalog Slack files newer than those already in the database"
+    )
     
     args = parser.parse_args()
     
@@ -40,10 +63,10 @@ def main():
     config = Config(args.config)
     
     # Override config with command line arguments
-    if args.batch_size:
-        config.config['migration']['batch_size'] = args.batch_size
-    if args.max_concurrent:
-        config.config['migration']['max_concurrent_downloads'] = args.max_concurrent
+    for arg_name, config_path in CLI_CONFIG_OVERRIDES.items():
+        value = getattr(args, arg_name)
+        if value is not None:
+            config.set(config_path, value)
     
     # Setup logging
     setup_logging(config)
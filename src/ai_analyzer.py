@@ -1,13 +1,39 @@
 """AI analysis module using Google Cloud Vision and Video Intelligence APIs."""
 
+import asyncio
 import os
-from typing import List, Dict, Any, Optional
+import aiofiles
+import aiofiles.os
+from typing import List, Dict, Any, Optional, Tuple
 from google.cloud import vision
 from google.cloud import videointelligence
 from google.cloud import storage
 from src.logger import MigrationLogger
 from src.config import Config
 
+# Vision accepts at most 16 images per batch_annotate_images call
+MAX_VISION_BATCH_SIZE = 16
+BATCH_FLUSH_DELAY_SECONDS = 0.05
+
+# Resumable upload chunk sizes for files staged in Cloud Storage
+VIDEO_UPLOAD_CHUNK_SIZE = 8 * 1024 * 1024
+IMAGE_UPLOAD_CHUNK_SIZE = 4 * 1024 * 1024
+
+# Tag types called out in file descriptions, in display order
+SPECIAL_FEATURE_TYPES = ('face', 'landmark', 'logo')
+
+# Longest detected-text tag stored per image
+MAX_TEXT_TAG_LENGTH = 2000
+
+# Labels listed in file descriptions
+LABEL_CONFIDENCE_THRESHOLD = 0.7
+MAX_DESCRIPTION_LABELS = 5
+
+def _resolve(future: asyncio.Future, tags: List[Dict[str, Any]]):
+    """Deliver a result unless the waiting caller has gone away."""
+    if not future.done():
+        future.set_result(tags)
+
 class AIAnalyzer:
     """AI-powered file analysis using Google Cloud APIs."""
     
@@ -17,119 +43,249 @@ class AIAnalyzer:
         self.vision_client = vision.ImageAnnotatorClient()
         self.video_client = videointelligence.VideoIntelligenceServiceClient()
         self.storage_client = storage.Client()
+        
+        # Bounds the number of blocking Google API calls in flight
+        self._sem = asyncio.Semaphore(config.max_concurrent_downloads)
+        
+        # Bucket used to stage files that are analyzed from Cloud Storage
+        self._analysis_bucket_name = f"{config.google_project_id}-video-analysis"
+        
+        # Feature requests are fixed by config, so build them once
+        max_results = config.get('google.vision.max_results', 10)
+        self._vision_features = [
+            vision.Feature(
+                type_=getattr(vision.Feature.Type, feature_name),
+                max_results=max_results
+            )
+            for feature_name in config.vision_features
+        ]
+        self._video_features = [
+            getattr(videointelligence.Feature, feature_name)
+            for feature_name in config.video_intelligence_features
+        ]
+        
+        # Image batching state
+        self._vision_batch_size = min(config.vision_batch_size, MAX_VISION_BATCH_SIZE)
+        self._inline_image_max_bytes = config.vision_inline_max_bytes
+        self._pending_images: List[Tuple[str, Optional[bytes], asyncio.Future]] = []
+        self._flush_timer: Optional[asyncio.TimerHandle] = None
+        self._background_tasks = set()
     
-    def analyze_image(self, file_path: str) -> List[Dict[str, Any]]:
-        """Analyze an image using Google Cloud Vision API."""
+    async def analyze_image(self, file_path: str, 
+                            content: Optional[bytes] = None) -> List[Dict[str, Any]]:
+        """Analyze an image using Google Cloud Vision API.
+        
+        Requests are queued and sent to Vision in batches, so concurrent
+        callers share a single batch_annotate_images round-trip. Images
+        already held in memory can be passed as content instead of being
+        read from file_path.
+        """
+        loop = asyncio.get_running_loop()
+        future = loop.create_future()
+        self._pending_images.append((file_path, content, future))
+        
+        if len(self._pending_images) >= self._vision_batch_size:
+            self._start_flush()
+        elif self._flush_timer is None:
+            self._flush_timer = loop.call_later(BATCH_FLUSH_DELAY_SECONDS, self._start_flush)
+        
+        return await future
+    
+    async def analyze_images(self, file_paths: List[str]) -> List[List[Dict[str, Any]]]:
+        """Analyze several images, batching the Vision API calls."""
+        return await asyncio.gather(*(self.analyze_image(path) for path in file_paths))
+    
+    def _start_flush(self):
+        """Hand the currently queued images off to a batch request."""
+        if self._flush_timer is not None:
+            self._flush_timer.cancel()
+            self._flush_timer = None
+        
+        batch = self._pending_images[:self._vision_batch_size]
+        del self._pending_images[:self._vision_batch_size]
+        if batch:
+            self._run_in_background(self._flush_batch(batch))
+        
+        # Anything left over waits for the next timer tick or a full batch
+        if self._pending_images:
+            loop = asyncio.get_running_loop()
+            self._flush_timer = loop.call_later(BATCH_FLUSH_DELAY_SECONDS, self._start_flush)
+    
+    async def _flush_batch(self, batch: List[Tuple[str, Optional[bytes], asyncio.Future]]):
+        """Send a batch of queued images to Vision and resolve their futures."""
+        staged_blobs = []
         try:
-            with open(file_path, 'rb') as image_file:
-                content = image_file.read()
-            
-            image = vision.Image(content=content)
-            
-            # Configure features based on config
-            features = []
-            for feature_name in self.config.vision_features:
-                features.append(getattr(vision.Feature.Type, feature_name))
+            await self._annotate_batch(batch, staged_blobs)
+        finally:
+            # Never leave a caller waiting, whatever happened above
+            for _, _, future in batch:
+                _resolve(future, [])
+            if staged_blobs:
+                self._run_in_background(asyncio.to_thread(self._delete_blobs, staged_blobs))
+    
+    async def _annotate_batch(self, batch: List[Tuple[str, Optional[bytes], asyncio.Future]],
+                              staged_blobs: List[storage.Blob]):
+        """Build the Vision requests for a batch and dispatch the results."""
+        requests = []
+        waiting = []
+        for file_path, content, future in batch:
+            try:
+                # Large images are read by Vision straight from Cloud Storage
+                # rather than being loaded into memory and sent inline
+                if content is not None:
+                    image = vision.Image(content=content)
+                elif await aiofiles.os.path.getsize(file_path) > self._inline_image_max_bytes:
+                    blob = await asyncio.to_thread(
+                        self._stage_in_gcs, file_path, IMAGE_UPLOAD_CHUNK_SIZE
+                    )
+                    staged_blobs.append(blob)
+                    image = vision.Image(source=vision.ImageSource(
+                        gcs_image_uri=f"gs://{blob.bucket.name}/{blob.name}"
+                    ))
+                else:
+                    async with aiofiles.open(file_path, 'rb') as image_file:
+                        image = vision.Image(content=await image_file.read())
+            except Exception as e:
+                self.logger.log_error_with_context(e, {
+                    "operation": "analyze_image",
+                    "file_path": file_path
+                })
+                _resolve(future, [])
+                continue
             
-            response = self.vision_client.annotate_image({
-                'image': image,
-                'features': [{'type': feature} for feature in features],
-                'max_results': self.config.get('google.vision.max_results', 10)
+            requests.append(vision.AnnotateImageRequest(
+                image=image,
+                features=self._vision_features
+            ))
+            waiting.append((file_path, future))
+        
+        if not requests:
+            return
+        
+        try:
+            async with self._sem:
+                batch_response = await asyncio.to_thread(
+                    self.vision_client.batch_annotate_images, requests=requests
+                )
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "analyze_image",
+                "batch_size": len(requests)
             })
+            for _, future in waiting:
+                _resolve(future, [])
+            return
+        
+        for (file_path, future), response in zip(waiting, batch_response.responses):
+            if response.error.message:
+                self.logger.error(f"Vision API error for image: {file_path}",
+                                  error_message=response.error.message)
+                _resolve(future, [])
+                continue
             
-            tags = []
-            
-            # Process different types of annotations
-            if response.label_annotations:
-                for label in response.label_annotations:
-                    tags.append({
-                        'type': 'label',
-                        'description': label.description,
-                        'confidence': label.score,
-                        'source': 'vision_api'
-                    })
-            
-            if response.text_annotations:
-                for text in response.text_annotations:
-                    tags.append({
-                        'type': 'text',
-                        'description': text.description,
-                        'confidence': text.confidence if hasattr(text, 'confidence') else 1.0,
-                        'source': 'vision_api'
-                    })
-            
-            if response.face_annotations:
-                for face in response.face_annotations:
-                    tags.append({
-                        'type': 'face',
-                        'description': f"Face detected (joy: {face.joy_likelihood}, sorrow: {face.sorrow_likelihood})",
-                        'confidence': 1.0,
-                        'source': 'vision_api'
-                    })
-            
-            if response.landmark_annotations:
-                for landmark in response.landmark_annotations:
-                    tags.append({
-                        'type': 'landmark',
-                        'description': landmark.description,
-                        'confidence': landmark.score,
-                        'source': 'vision_api'
-                    })
-            
-            if response.logo_annotations:
-                for logo in response.logo_annotations:
-                    tags.append({
-                        'type': 'logo',
-                        'description': logo.description,
-                        'confidence': logo.score,
-                        'source': 'vision_api'
-                    })
-            
-            if response.web_detection:
-                web = response.web_detection
-                if web.web_entities:
-                    for entity in web.web_entities:
-                        tags.append({
-                            'type': 'web_entity',
-                            'description': entity.description,
-                            'confidence': entity.score,
-                            'source': 'vision_api'
-                        })
-            
+            tags = self._extract_image_tags(response)
             self.logger.info(f"Analyzed image: {file_path}", 
                            tags_count=len(tags))
-            return tags
-            
-        except Exception as e:
-            self.logger.log_error_with_context(e, {
-                "operation": "analyze_image",
-                "file_path": file_path
+            _resolve(future, tags)
+    
+    def _extract_image_tags(self, response: vision.AnnotateImageResponse) -> List[Dict[str, Any]]:
+        """Convert a Vision API response into tag dictionaries."""
+        tags = []
+        
+        # Process different types of annotations
+        if response.label_annotations:
+            for label in response.label_annotations:
+                tags.append({
+                    'type': 'label',
+                    'description': label.description,
+                    'confidence': label.score,
+                    'source': 'vision_api'
+                })
+        
+        if response.text_annotations:
+            # The first annotation holds the full detected text; the rest
+            # repeat it word by word, so only the aggregate is kept
+            text = response.text_annotations[0]
+            tags.append({
+                'type': 'text',
+                'description': text.description[:MAX_TEXT_TAG_LENGTH],
+                'confidence': text.confidence if hasattr(text, 'confidence') else 1.0,
+                'source': 'vision_api'
             })
-            return []
+        
+        if response.face_annotations:
+            for face in response.face_annotations:
+                tags.append({
+                    'type': 'face',
+                    'description': f"Face detected (joy: {face.joy_likelihood}, sorrow: {face.sorrow_likelihood})",
+                    'confidence': 1.0,
+                    'source': 'vision_api'
+                })
+        
+        if response.landmark_annotations:
+            for landmark in response.landmark_annotations:
+                tags.append({
+                    'type': 'landmark',
+                    'description': landmark.description,
+                    'confidence': landmark.score,
+                    'source': 'vision_api'
+                })
+        
+        if response.logo_annotations:
+            for logo in response.logo_annotations:
+                tags.append({
+                    'type': 'logo',
+                    'description': logo.description,
+                    'confidence': logo.score,
+                    'source': 'vision_api'
+                })
+        
+        if response.web_detection:
+            web = response.web_detection
+            if web.web_entities:
+                seen_entities = set()
+                for entity in web.web_entities:
+                    key = entity.description.lower()
+                    if not key or key in seen_entities:
+                        continue
+                    seen_entities.add(key)
+                    tags.append({
+                        'type': 'web_entity',
+                        'description': entity.description,
+                        'confidence': entity.score,
+                        'source': 'vision_api'
+                    })
+        
+        return tags
     
-    def analyze_video(self, file_path: str) -> List[Dict[str, Any]]:
+    async def analyze_video(self, file_path: str) -> List[Dict[str, Any]]:
         """Analyze a video using Google Cloud Video Intelligence API."""
+        async with self._sem:
+            tags, blob = await asyncio.to_thread(self._analyze_video_sync, file_path)
+        
+        # Clean up the staged upload without holding up the caller
+        if blob is not None:
+            self._run_in_background(asyncio.to_thread(self._delete_blobs, [blob]))
+        
+        return tags
+    
+    def _analyze_video_sync(self, file_path: str) -> Tuple[List[Dict[str, Any]], Optional[storage.Blob]]:
+        """Blocking video analysis, run in a worker thread.
+        
+        Returns the tags together with the staged Cloud Storage blob so the
+        caller can remove it once analysis is done.
+        """
+        blob = None
         try:
             # Upload file to Cloud Storage for analysis
-            bucket_name = f"{self.config.google_project_id}-video-analysis"
-            blob_name = os.path.basename(file_path)
-            
-            bucket = self.storage_client.bucket(bucket_name)
-            blob = bucket.blob(blob_name)
-            blob.upload_from_filename(file_path)
-            
-            gcs_uri = f"gs://{bucket_name}/{blob_name}"
-            
-            # Configure features
-            features = []
-            for feature_name in self.config.video_intelligence_features:
-                features.append(getattr(videointelligence.Feature, feature_name))
+            blob = self._stage_in_gcs(file_path, VIDEO_UPLOAD_CHUNK_SIZE)
+            gcs_uri = f"gs://{blob.bucket.name}/{blob.name}"
             
             # Start analysis
             operation = self.video_client.annotate_video(
                 request={
                     "input_uri": gcs_uri,
-                    "features": features,
+                    "features": self._video_features,
                 }
             )
             
@@ -172,19 +328,43 @@ class AIAnalyzer:
                                 'source': 'video_intelligence_api'
                             })
             
-            # Clean up uploaded file
-            blob.delete()
-            
             self.logger.info(f"Analyzed video: {file_path}", 
                            tags_count=len(tags))
-            return tags
+            return tags, blob
             
         except Exception as e:
             self.logger.log_error_with_context(e, {
                 "operation": "analyze_video",
                 "file_path": file_path
             })
-            return []
+            return [], blob
+    
+    def _stage_in_gcs(self, file_path: str, chunk_size: int) -> storage.Blob:
+        """Stream a local file into the analysis bucket."""
+        bucket = self.storage_client.bucket(self._analysis_bucket_name)
+        blob = bucket.blob(os.path.basename(file_path), chunk_size=chunk_size)
+        
+        # Stream the file through a chunked resumable upload
+        with open(file_path, 'rb', buffering=0) as staged_file:
+            blob.upload_from_file(staged_file)
+        return blob
+    
+    def _delete_blobs(self, blobs: List[storage.Blob]):
+        """Delete staged analysis blobs, ignoring objects already gone."""
+        try:
+            bucket = self.storage_client.bucket(self._analysis_bucket_name)
+            bucket.delete_blobs(blobs, on_error=lambda b: None)
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "delete_blobs",
+                "blob_names": [blob.name for blob in blobs]
+            })
+    
+    def _run_in_background(self, coro):
+        """Schedule a coroutine and keep a reference until it finishes."""
+        task = asyncio.ensure_future(coro)
+        self._background_tasks.add(task)
+        task.add_done_callback(self._background_tasks.discard)
     
     def generate_file_description(self, tags: List[Dict[str, Any]], 
                                 file_type: str) -> str:
@@ -192,36 +372,47 @@ class AIAnalyzer:
         if not tags:
             return f"Uploaded {file_type} file"
         
-        # Group tags by type
-        tag_groups = {}
+        # Collect everything the description needs in a single pass
+        high_conf_labels = []
+        first_text = None
+        found_features = set()
         for tag in tags:
             tag_type = tag.get('type', 'unknown')
-            if tag_type not in tag_groups:
-                tag_groups[tag_type] = []
-            tag_groups[tag_type].append(tag)
+            if tag_type == 'label':
+                if (len(high_conf_labels) >= MAX_DESCRIPTION_LABELS
+                        or tag.get('confidence', 0) <= LABEL_CONFIDENCE_THRESHOLD):
+                    continue
+                high_conf_labels.append(tag['description'])
+            elif tag_type == 'text':
+                if first_text is not None:
+                    continue
+                first_text = tag['description']
+            elif tag_type in SPECIAL_FEATURE_TYPES:
+                found_features.add(tag_type)
+            else:
+                continue
+            
+            # Stop once nothing further could change the description
+            if (len(high_conf_labels) == MAX_DESCRIPTION_LABELS
+                    and first_text is not None
+                    and len(found_features) == len(SPECIAL_FEATURE_TYPES)):
+                break
         
         description_parts = []
         
         # Add high-confidence labels
-        if 'label' in tag_groups:
-            high_conf_labels = [
-                tag['description'] for tag in tag_groups['label'] 
-                if tag.get('confidence', 0) > 0.7
-            ]
-            if high_conf_labels:
-                description_parts.append(f"Contains: {', '.join(high_conf_labels[:5])}")
+        if high_conf_labels:
+            description_parts.append(f"Contains: {', '.join(high_conf_labels)}")
         
         # Add text content
-        if 'text' in tag_groups:
-            text_content = [tag['description'] for tag in tag_groups['text']]
-            if text_content:
-                description_parts.append(f"Text: {text_content[0][:100]}...")
+        if first_text is not None:
+            description_parts.append(f"Text: {first_text[:100]}...")
         
         # Add special features
-        special_features = []
-        for feature_type in ['face', 'landmark', 'logo']:
-            if feature_type in tag_groups:
-                special_features.append(feature_type)
+        special_features = [
+            feature_type for feature_type in SPECIAL_FEATURE_TYPES
+            if feature_type in found_features
+        ]
         
         if special_features:
             description_parts.append(f"Features: {', '.join(special_features)}")
@@ -17,6 +17,9 @@ class Config:
         
         # Override with environment variables
         self._load_env_overrides()
+        
+        # Flat dot-path index so lookups are a single dict access
+        self._rebuild_flat()
     
     def _load_env_overrides(self):
         """Load configuration overrides from environment variables."""
@@ -37,16 +40,8 @@ class Config:
             if value:
                 self._set_nested_value(config_path, value)
     
-    def _set_nested_value(self, path: str, value: Any):
-        """Set a nested configuration value using dot notation."""
-        keys = path.split('.')
-        current = self.config
-        
-        for key in keys[:-1]:
-            if key not in current:
-                current[key] = {}
-            current = current[key]
-        
+    def _set_nested_value(self, path: str, value: str):
+        """Set a nested configuration value from an environment string."""
         # Convert numeric strings to appropriate types
         if value.isdigit():
             value = int(value)
@@ -55,19 +50,39 @@ class Config:
         elif value.lower() in ('true', 'false'):
             value = value.lower() == 'true'
         
+        self.set(path, value)
+    
+    def _rebuild_flat(self):
+        """Rebuild the dot-path lookup table from the nested config."""
+        self._flat = {}
+        self._flatten(self.config or {}, '')
+    
+    def _flatten(self, node: Dict[str, Any], prefix: str):
+        """Index every key of a nested dict under its dot path."""
+        for key, value in node.items():
+            path = f"{prefix}{key}"
+            self._flat[path] = value
+            if isinstance(value, dict):
+                self._flatten(value, f"{path}.")
+    
+    def set(self, path: str, value: Any):
+        """Set configuration value using dot notation."""
+        keys = path.split('.')
+        if self.config is None:
+            self.config = {}
+        current = self.config
+        
+        for key in keys[:-1]:
+            if key not in current:
+                current[key] = {}
+            current = current[key]
+        
         current[keys[-1]] = value
+        self._rebuild_flat()
     
     def get(self, path: str, default: Any = None) -> Any:
         """Get configuration value using dot notation."""
-        keys = path.split('.')
-        current = self.config
-        
-        try:
-            for key in keys:
-                current = current[key]
-            return current
-        except (KeyError, TypeError):
-            return default
+        return self._flat.get(path, default)
     
     @property
     def slack_token(self) -> str:
@@ -119,11 +134,31 @@ class Config:
         """Get maximum concurrent downloads."""
         return self.get('migration.max_concurrent_downloads', 5)
     
+    @property
+    def max_concurrent_migrations(self) -> int:
+        """Get maximum number of files migrated concurrently."""
+        return self.get('migration.max_concurrent_migrations', 8)
+    
+    @property
+    def drive_upload_workers(self) -> int:
+        """Get number of threads uploading to Google Drive."""
+        return self.get('migration.drive_upload_workers', 4)
+    
     @property
     def retry_attempts(self) -> int:
         """Get number of retry attempts."""
         return self.get('migration.retry_attempts', 3)
     
+    @property
+    def retry_delay_seconds(self) -> float:
+        """Get base delay between retry attempts."""
+        return self.get('migration.retry_delay_seconds', 5)
+    
+    @property
+    def incremental_sync(self) -> bool:
+        """Get whether cataloging only fetches files newer than the last run."""
+        return self.get('migration.incremental', False)
+    
     @property
     def webhook_secret(self) -> str:
         """Get webhook secret."""
@@ -144,11 +179,31 @@ class Config:
         """Get webhook endpoint."""
         return self.get('webhook.endpoint', '/slack/webhook')
     
+    @property
+    def webhook_workers(self) -> int:
+        """Get number of webhook server worker processes."""
+        return self.get('webhook.workers', 1)
+    
+    @property
+    def webhook_threads(self) -> int:
+        """Get number of request threads per webhook worker."""
+        return self.get('webhook.threads', 8)
+    
     @property
     def vision_features(self) -> List[str]:
         """Get Google Vision API features."""
         return self.get('google.vision.features', [])
     
+    @property
+    def vision_batch_size(self) -> int:
+        """Get number of images sent per Vision API batch request."""
+        return self.get('google.vision.batch_size', 16)
+    
+    @property
+    def vision_inline_max_bytes(self) -> int:
+        """Get largest image size sent inline to the Vision API."""
+        return self.get('google.vision.inline_max_bytes', 512 * 1024)
+    
     @property
     def video_intelligence_features(self) -> List[str]:
         """Get Google Video Intelligence API features."""
@@ -1,13 +1,15 @@
 """Database management for tracking migration progress and metadata."""
 
 import sqlite3
-import json
+import orjson
+import threading
+from contextlib import contextmanager
 from datetime import datetime
-from typing import Dict, List, Optional, Any
+from typing import Dict, List, Optional, Any, Set, Tuple
 from dataclasses import dataclass
 from src.logger import MigrationLogger
 
-@dataclass
+@dataclass(slots=True)
 class FileRecord:
     """Represents a file record in the database."""
     id: str
@@ -25,6 +27,85 @@ class FileRecord:
     error_message: Optional[str] = None
     tags: Optional[str] = None  # JSON string of tags
     metadata: Optional[str] = None  # JSON string of additional metadata
+    url_private_download: Optional[str] = None  # Slack download URL from files.list
+
+# Rows per transaction for bulk inserts, keeps WAL growth bounded
+BULK_INSERT_CHUNK_SIZE = 500
+
+# Column order shared by inserts, selects and _row_to_file_record
+_FILE_COLUMNS = """
+    id, slack_file_id, slack_channel_id, slack_user_id,
+    file_name, file_type, file_size, upload_timestamp,
+    google_drive_file_id, google_drive_folder_id,
+    migration_status, migration_timestamp, error_message,
+    tags, metadata, url_private_download
+"""
+
+_INSERT_FILE_SQL = f"""
+    INSERT OR IGNORE INTO files ({_FILE_COLUMNS})
+    VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
+"""
+
+# Refreshes Slack metadata for files already known but not yet migrated
+_UPDATE_FILE_SQL = """
+    UPDATE files
+    SET slack_channel_id = ?,
+        slack_user_id = ?,
+        file_name = ?,
+        file_type = ?,
+        file_size = ?,
+        upload_timestamp = ?,
+        url_private_download = COALESCE(?, url_private_download),
+        updated_at = CURRENT_TIMESTAMP
+    WHERE id = ? AND migration_status = 'pending'
+"""
+
+# Keyset pagination over pending files, grouped by channel then user so
+# consecutive files share Drive folders and warm caches
+_SELECT_PENDING_PAGE_SQL = f"""
+    SELECT {_FILE_COLUMNS} FROM files
+    WHERE migration_status = 'pending'
+      AND (slack_channel_id, slack_user_id, id) > (?, ?, ?)
+    ORDER BY slack_channel_id, slack_user_id, id
+    LIMIT ?
+"""
+
+# Rows fetched per round-trip into the sqlite3 module
+FETCH_ARRAY_SIZE = 1000
+
+def _file_update_params(file_record: FileRecord) -> tuple:
+    """Build the UPDATE parameters for a file record."""
+    return (
+        file_record.slack_channel_id,
+        file_record.slack_user_id,
+        file_record.file_name,
+        file_record.file_type,
+        file_record.file_size,
+        file_record.upload_timestamp,
+        file_record.url_private_download,
+        file_record.id
+    )
+
+def _file_record_params(file_record: FileRecord) -> tuple:
+    """Build the INSERT parameters for a file record."""
+    return (
+        file_record.id,
+        file_record.slack_file_id,
+        file_record.slack_channel_id,
+        file_record.slack_user_id,
+        file_record.file_name,
+        file_record.file_type,
+        file_record.file_size,
+        file_record.upload_timestamp,
+        file_record.google_drive_file_id,
+        file_record.google_drive_folder_id,
+        file_record.migration_status,
+        file_record.migration_timestamp,
+        file_record.error_message,
+        file_record.tags,
+        file_record.metadata,
+        file_record.url_private_download
+    )
 
 class DatabaseManager:
     """Manages database operations for migration tracking."""
@@ -32,13 +113,56 @@ class DatabaseManager:
     def __init__(self, db_path: str):
         self.db_path = db_path
         self.logger = MigrationLogger("database")
+        
+        # One long-lived connection shared by all callers; the lock
+        # serializes access since sqlite3 connections are not thread-safe
+        self._lock = threading.RLock()
+        self._conn = sqlite3.connect(
+            db_path, check_same_thread=False, isolation_level=None
+        )
+        self._conn.execute("PRAGMA journal_mode=WAL")
+        self._conn.execute("PRAGMA synchronous=NORMAL")
+        self._conn.execute("PRAGMA temp_store=MEMORY")
+        
         self._init_database()
     
+    @contextmanager
+    def transaction(self):
+        """Group several write calls into a single commit.
+        
+        Write methods called inside the block join this transaction
+        instead of committing on their own.
+        """
+        with self._write_transaction():
+            yield
+    
+    @contextmanager
+    def _write_transaction(self):
+        """Yield a cursor inside a single IMMEDIATE write transaction."""
+        with self._lock:
+            # Join a transaction already opened by transaction()
+            if self._conn.in_transaction:
+                yield self._conn.cursor()
+                return
+            
+            self._conn.execute("BEGIN IMMEDIATE")
+            try:
+                yield self._conn.cursor()
+            except BaseException:
+                # Some errors, such as a full disk, already rolled back
+                if self._conn.in_transaction:
+                    self._conn.execute("ROLLBACK")
+                raise
+            self._conn.execute("COMMIT")
+    
+    def close(self):
+        """Close the database connection."""
+        with self._lock:
+            self._conn.close()
+    
     def _init_database(self):
         """Initialize database tables."""
-        with sqlite3.connect(self.db_path) as conn:
-            cursor = conn.cursor()
-            
+        with self._write_transaction() as cursor:
             # Files table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS files (
@@ -57,11 +181,25 @@ class DatabaseManager:
                     error_message TEXT,
                     tags TEXT,
                     metadata TEXT,
+                    url_private_download TEXT,
                     created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
                     updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
                 )
             """)
             
+            # Databases created before the download URL was cataloged
+            cursor.execute("PRAGMA table_info(files)")
+            if 'url_private_download' not in {row[1] for row in cursor.fetchall()}:
+                cursor.execute("ALTER TABLE files ADD COLUMN url_private_download TEXT")
+            
+            # Partial index so pending pages are an index range seek
+            # over pending rows only, in page order
+            cursor.execute("""
+                CREATE INDEX IF NOT EXISTS idx_files_pending_order
+                ON files(slack_channel_id, slack_user_id, id)
+                WHERE migration_status = 'pending'
+            """)
+            
             # Channels table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS channels (
@@ -84,6 +222,26 @@ class DatabaseManager:
                 )
             """)
             
+            # Drive folder IDs resolved by earlier runs
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS drive_folders (
+                    parent_id TEXT NOT NULL,
+                    name TEXT NOT NULL,
+                    folder_id TEXT NOT NULL,
+                    created_at DATETIME DEFAULT CURRENT_TIMESTAMP,
+                    PRIMARY KEY (parent_id, name)
+                )
+            """)
+            
+            # Progress markers for resumable and incremental syncs
+            cursor.execute("""
+                CREATE TABLE IF NOT EXISTS sync_state (
+                    key TEXT PRIMARY KEY,
+                    value TEXT NOT NULL,
+                    updated_at DATETIME DEFAULT CURRENT_TIMESTAMP
+                )
+            """)
+            
             # Migration stats table
             cursor.execute("""
                 CREATE TABLE IF NOT EXISTS migration_stats (
@@ -95,39 +253,70 @@ class DatabaseManager:
                 )
             """)
             
-            conn.commit()
-            self.logger.info("Database initialized successfully")
+            # Seed the live counter row from existing data once
+            cursor.execute("SELECT 1 FROM migration_stats WHERE id = 1")
+            if cursor.fetchone() is None:
+                cursor.execute("""
+                    INSERT INTO migration_stats (id, total_files, migrated_files, failed_files)
+                    SELECT 
+                        1,
+                        COUNT(*),
+                        COALESCE(SUM(migration_status = 'completed'), 0),
+                        COALESCE(SUM(migration_status = 'failed'), 0)
+                    FROM files
+                """)
+            
+            # Keep the counter row in step with every change to files
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_files_stats_insert
+                AFTER INSERT ON files
+                BEGIN
+                    UPDATE migration_stats
+                    SET total_files = total_files + 1,
+                        migrated_files = migrated_files + (NEW.migration_status IS 'completed'),
+                        failed_files = failed_files + (NEW.migration_status IS 'failed'),
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE id = 1;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_files_stats_delete
+                AFTER DELETE ON files
+                BEGIN
+                    UPDATE migration_stats
+                    SET total_files = total_files - 1,
+                        migrated_files = migrated_files - (OLD.migration_status IS 'completed'),
+                        failed_files = failed_files - (OLD.migration_status IS 'failed'),
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE id = 1;
+                END
+            """)
+            cursor.execute("""
+                CREATE TRIGGER IF NOT EXISTS trg_files_stats_update
+                AFTER UPDATE OF migration_status ON files
+                WHEN OLD.migration_status IS NOT NEW.migration_status
+                BEGIN
+                    UPDATE migration_stats
+                    SET migrated_files = migrated_files
+                            + (NEW.migration_status IS 'completed')
+                            - (OLD.migration_status IS 'completed'),
+                        failed_files = failed_files
+                            + (NEW.migration_status IS 'failed')
+                            - (OLD.migration_status IS 'failed'),
+                        last_updated = CURRENT_TIMESTAMP
+                    WHERE id = 1;
+                END
+            """)
+            
+        self.logger.info("Database initialized successfully")
     
     def add_file_record(self, file_record: FileRecord) -> bool:
-        """Add a new file record to the database."""
+        """Add a new file record, refreshing it if it is still pending."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
-                cursor.execute("""
-                    INSERT OR REPLACE INTO files (
-                        id, slack_file_id, slack_channel_id, slack_user_id,
-                        file_name, file_type, file_size, upload_timestamp,
-                        google_drive_file_id, google_drive_folder_id,
-                        migration_status, migration_timestamp, error_message,
-                        tags, metadata
-                    ) VALUES (?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?, ?)
-                """, (
-                    file_record.id,
-                    file_record.slack_file_id,
-                    file_record.slack_channel_id,
-                    file_record.slack_user_id,
-                    file_record.file_name,
-                    file_record.file_type,
-                    file_record.upload_timestamp,
-                    file_record.google_drive_file_id,
-                    file_record.google_drive_folder_id,
-                    file_record.migration_status,
-                    file_record.migration_timestamp,
-                    file_record.error_message,
-                    file_record.tags,
-                    file_record.metadata
-                ))
-                conn.commit()
+            with self._write_transaction() as cursor:
+                cursor.execute(_INSERT_FILE_SQL, _file_record_params(file_record))
+                if cursor.rowcount == 0:
+                    cursor.execute(_UPDATE_FILE_SQL, _file_update_params(file_record))
                 return True
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -136,13 +325,36 @@ class DatabaseManager:
             })
             return False
     
+    def add_file_records(self, file_records: List[FileRecord]) -> bool:
+        """Add many file records, one transaction per chunk of rows."""
+        try:
+            for start in range(0, len(file_records), BULK_INSERT_CHUNK_SIZE):
+                chunk = file_records[start:start + BULK_INSERT_CHUNK_SIZE]
+                with self._write_transaction() as cursor:
+                    cursor.executemany(
+                        _INSERT_FILE_SQL,
+                        (_file_record_params(record) for record in chunk)
+                    )
+                    # Some rows already existed, refresh those still pending
+                    if cursor.rowcount < len(chunk):
+                        cursor.executemany(
+                            _UPDATE_FILE_SQL,
+                            (_file_update_params(record) for record in chunk)
+                        )
+            return True
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "add_file_records",
+                "record_count": len(file_records)
+            })
+            return False
+    
     def update_file_migration_status(self, file_id: str, status: str, 
                                    google_drive_file_id: str = None,
                                    error_message: str = None) -> bool:
         """Update file migration status."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._write_transaction() as cursor:
                 cursor.execute("""
                     UPDATE files 
                     SET migration_status = ?, 
@@ -152,7 +364,6 @@ class DatabaseManager:
                         updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
                 """, (status, google_drive_file_id, error_message, file_id))
-                conn.commit()
                 return True
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -165,14 +376,12 @@ class DatabaseManager:
     def update_file_tags(self, file_id: str, tags: List[Dict[str, Any]]) -> bool:
         """Update file tags."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._write_transaction() as cursor:
                 cursor.execute("""
                     UPDATE files 
                     SET tags = ?, updated_at = CURRENT_TIMESTAMP
                     WHERE id = ?
-                """, (json.dumps(tags), file_id))
-                conn.commit()
+                """, (orjson.dumps(tags).decode(), file_id))
                 return True
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -181,18 +390,25 @@ class DatabaseManager:
             })
             return False
     
-    def get_pending_files(self, limit: int = None) -> List[FileRecord]:
-        """Get files pending migration."""
+    def get_pending_files(self, after: Optional[FileRecord] = None, 
+                          limit: int = 100) -> List[FileRecord]:
+        """Get a page of files pending migration, ordered by channel and user.
+        
+        Pass the last record from the previous page as after to fetch
+        the next one.
+        """
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                conn.row_factory = sqlite3.Row
-                cursor = conn.cursor()
-                
-                query = "SELECT * FROM files WHERE migration_status = 'pending'"
-                if limit:
-                    query += f" LIMIT {limit}"
-                
-                cursor.execute(query)
+            if not isinstance(limit, int) or limit < 1:
+                raise ValueError(f"Invalid limit: {limit!r}")
+            
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.arraysize = FETCH_ARRAY_SIZE
+                after_key = (
+                    (after.slack_channel_id, after.slack_user_id, after.id)
+                    if after else ('', '', '')
+                )
+                cursor.execute(_SELECT_PENDING_PAGE_SQL, (*after_key, limit))
                 rows = cursor.fetchall()
                 
                 return [self._row_to_file_record(row) for row in rows]
@@ -200,17 +416,122 @@ class DatabaseManager:
             self.logger.log_error_with_context(e, {"operation": "get_pending_files"})
             return []
     
+    def get_pending_file_ids(self, file_ids: List[str]) -> Set[str]:
+        """Get which of the given files are still pending migration."""
+        try:
+            pending = set()
+            with self._lock:
+                cursor = self._conn.cursor()
+                for start in range(0, len(file_ids), BULK_INSERT_CHUNK_SIZE):
+                    chunk = file_ids[start:start + BULK_INSERT_CHUNK_SIZE]
+                    cursor.execute(f"""
+                        SELECT id FROM files
+                        WHERE migration_status = 'pending'
+                        AND id IN ({', '.join('?' * len(chunk))})
+                    """, chunk)
+                    pending.update(row[0] for row in cursor.fetchall())
+            return pending
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "get_pending_file_ids",
+                "file_count": len(file_ids)
+            })
+            return set()
+    
+    def add_drive_folders(self, folders: Dict[Tuple[str, str], str]) -> bool:
+        """Record Drive folder IDs keyed by (parent_id, name)."""
+        try:
+            with self._write_transaction() as cursor:
+                cursor.executemany("""
+                    INSERT OR REPLACE INTO drive_folders (parent_id, name, folder_id)
+                    VALUES (?, ?, ?)
+                """, ((parent_id, name, folder_id)
+                      for (parent_id, name), folder_id in folders.items()))
+                return True
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "add_drive_folders",
+                "folder_count": len(folders)
+            })
+            return False
+    
+    def get_drive_folders(self) -> Dict[Tuple[str, str], str]:
+        """Get all recorded Drive folder IDs keyed by (parent_id, name)."""
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.arraysize = FETCH_ARRAY_SIZE
+                cursor.execute("SELECT parent_id, name, folder_id FROM drive_folders")
+                return {(parent_id, name): folder_id
+                        for parent_id, name, folder_id in cursor.fetchall()}
+        except Exception as e:
+            self.logger.log_error_with_context(e, {"operation": "get_drive_folders"})
+            return {}
+    
+    def add_channel_folders(self, channels: List[Tuple[str, str, str]]) -> bool:
+        """Record (channel_id, name, google_drive_folder_id) for channels."""
+        try:
+            with self._write_transaction() as cursor:
+                cursor.executemany("""
+                    INSERT INTO channels (id, name, google_drive_folder_id)
+                    VALUES (?, ?, ?)
+                    ON CONFLICT(id) DO UPDATE SET
+                        name = excluded.name,
+                        google_drive_folder_id = excluded.google_drive_folder_id
+                """, channels)
+                return True
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "add_channel_folders",
+                "channel_count": len(channels)
+            })
+            return False
+    
+    def get_sync_state(self, key: str) -> Optional[str]:
+        """Get a stored sync marker."""
+        try:
+            with self._lock:
+                cursor = self._conn.cursor()
+                cursor.execute("SELECT value FROM sync_state WHERE key = ?", (key,))
+                row = cursor.fetchone()
+                return row[0] if row else None
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "get_sync_state",
+                "key": key
+            })
+            return None
+    
+    def set_sync_state(self, key: str, value: Optional[str]) -> bool:
+        """Store a sync marker, or clear it when value is None."""
+        try:
+            with self._write_transaction() as cursor:
+                if value is None:
+                    cursor.execute("DELETE FROM sync_state WHERE key = ?", (key,))
+                else:
+                    cursor.execute("""
+                        INSERT INTO sync_state (key, value) VALUES (?, ?)
+                        ON CONFLICT(key) DO UPDATE SET
+                            value = excluded.value,
+                            updated_at = CURRENT_TIMESTAMP
+                    """, (key, value))
+                return True
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "set_sync_state",
+                "key": key
+            })
+            return False
+    
     def get_migration_stats(self) -> Dict[str, int]:
         """Get migration statistics."""
         try:
-            with sqlite3.connect(self.db_path) as conn:
-                cursor = conn.cursor()
+            with self._lock:
+                cursor = self._conn.cursor()
                 cursor.execute("""
-                    SELECT 
-                        COUNT(*) as total_files,
-                        SUM(CASE WHEN migration_status = 'completed' THEN 1 ELSE 0 END) as migrated_files,
-                        SUM(CASE WHEN migration_status = 'failed' THEN 1 ELSE 0 END) as failed_files
-                    FROM files
+                    SELECT total_files, migrated_files, failed_files
+                    FROM migration_stats
+                    WHERE id = 1
                 """)
                 row = cursor.fetchone()
                 return {
@@ -222,24 +543,30 @@ class DatabaseManager:
             self.logger.log_error_with_context(e, {"operation": "get_migration_stats"})
             return {"total_files": 0, "migrated_files": 0, "failed_files": 0}
     
-    def _row_to_file_record(self, row: sqlite3.Row) -> FileRecord:
-        """Convert database row to FileRecord object."""
+    def _row_to_file_record(self, row: tuple) -> FileRecord:
+        """Convert a database row selected with _FILE_COLUMNS to a FileRecord."""
+        (file_id, slack_file_id, slack_channel_id, slack_user_id,
+         file_name, file_type, file_size, upload_timestamp,
+         google_drive_file_id, google_drive_folder_id,
+         migration_status, migration_timestamp, error_message,
+         tags, metadata, url_private_download) = row
         return FileRecord(
-            id=row['id'],
-            slack_file_id=row['slack_file_id'],
-            slack_channel_id=row['slack_channel_id'],
-            slack_user_id=row['slack_user_id'],
-            file_name=row['file_name'],
-            file_type=row['file_type'],
-            file_size=row['file_size'],
-            upload_timestamp=datetime.fromisoformat(row['upload_timestamp']),
-            google_drive_file_id=row['google_drive_file_id'],
-            google_drive_folder_id=row['google_drive_folder_id'],
-            migration_status=row['migration_status'],
-            migration_timestamp=datetime.fromisoformat(row['migration_timestamp']) if row['migration_timestamp'] else None,
-            error_message=row['error_message'],
-            tags=row['tags'],
-            metadata=row['metadata']
+            id=file_id,
+            slack_file_id=slack_file_id,
+            slack_channel_id=slack_channel_id,
+            slack_user_id=slack_user_id,
+            file_name=file_name,
+            file_type=file_type,
+            file_size=file_size,
+            upload_timestamp=datetime.fromisoformat(upload_timestamp),
+            google_drive_file_id=google_drive_file_id,
+            google_drive_folder_id=google_drive_folder_id,
+            migration_status=migration_status,
+            migration_timestamp=datetime.fromisoformat(migration_timestamp) if migration_timestamp else None,
+            error_message=error_message,
+            tags=tags,
+            metadata=metadata,
+            url_private_download=url_private_download
         )
 
 # tweak 18 at 2025-09-26 19:30:07
@@ -1,30 +1,101 @@
 """Google Drive API client for file operations and folder management."""
 
+import io
 import os
-from typing import List, Dict, Any, Optional
+import threading
+from concurrent.futures import Future, ThreadPoolExecutor
+from typing import List, Dict, Any, Optional, Tuple
 from google.oauth2 import service_account
+from google_auth_httplib2 import AuthorizedHttp
 from googleapiclient.discovery import build
 from googleapiclient.errors import HttpError
-from googleapiclient.http import MediaFileUpload
+from googleapiclient.http import HttpRequest, MediaFileUpload, MediaIoBaseUpload, build_http
 from src.logger import MigrationLogger
+from src.retry import retry_with_backoff
 from src.config import Config
+from src.database import DatabaseManager
+
+# Requests per batch call; Drive starts returning 500s on larger batches
+DRIVE_BATCH_SIZE = 25
+
+# Resumable upload chunk size; must be a multiple of 256 KiB
+DRIVE_UPLOAD_CHUNK_SIZE = 32 * 1024 * 1024
+
+def _escape_q(value: str) -> str:
+    """Escape a value for use inside a quoted Drive query string."""
+    return value.replace('\\', '\\\\').replace("'", "\\'")
 
 class GoogleDriveClient:
     """Client for interacting with Google Drive API."""
     
-    def __init__(self, config: Config):
+    def __init__(self, config: Config, db: Optional[DatabaseManager] = None):
         self.config = config
         self.logger = MigrationLogger("google_drive_client")
-        self.service = self._build_service()
+        self.db = db
+        
+        # googleapiclient services are not thread-safe, so every thread
+        # gets its own; building one here surfaces credential errors early
+        self._credentials = None
+        self._local = threading.local()
+        self._local.service = self._build_service()
+        self._executor = ThreadPoolExecutor(
+            max_workers=config.drive_upload_workers,
+            thread_name_prefix="drive-upload"
+        )
+        
+        # (parent_id, name) -> folder_id for folders seen or created,
+        # seeded from earlier runs when a database is available
+        self._folder_cache: Dict[Tuple[str, str], str] = db.get_drive_folders() if db else {}
+        # Parents whose child folders are all known to the cache
+        self._prefetched_parents = set()
+    
+    @property
+    def service(self):
+        """Get the Drive service for the calling thread."""
+        service = getattr(self._local, 'service', None)
+        if service is None:
+            service = self._local.service = self._build_service()
+        return service
+    
+    def close(self):
+        """Wait for queued uploads and stop the upload threads."""
+        self._executor.shutdown(wait=True)
+    
+    def _remember_folders(self, folders: Dict[Tuple[str, str], str]):
+        """Add folders to the cache and persist them for later runs."""
+        self._folder_cache.update(folders)
+        if self.db and folders:
+            self.db.add_drive_folders(folders)
+    
+    def _retry(self, fn, operation: str, throttling_only: bool = False):
+        """Run a Drive request, retrying throttling and server errors.
+        
+        Requests that create something pass throttling_only, since a
+        server error or dropped connection may hide one that succeeded.
+        """
+        return retry_with_backoff(
+            fn,
+            max_attempts=self.config.retry_attempts + 1,
+            base_delay=self.config.retry_delay_seconds,
+            operation=operation,
+            throttling_only=throttling_only
+        )
     
     def _build_service(self):
         """Build Google Drive service with authentication."""
         try:
-            credentials = service_account.Credentials.from_service_account_file(
-                self.config.google_credentials_path,
-                scopes=['https://www.googleapis.com/auth/drive']
-            )
-            return build('drive', 'v3', credentials=credentials)
+            if self._credentials is None:
+                self._credentials = service_account.Credentials.from_service_account_file(
+                    self.config.google_credentials_path,
+                    scopes=['https://www.googleapis.com/auth/drive']
+                )
+            # One keep-alive connection pool per service, and so per thread,
+            # reused by every request that service makes
+            http = AuthorizedHttp(self._credentials, http=build_http())
+            # Use the discovery document bundled with the library rather
+            # than fetching one, and skip the unused discovery file cache
+            return build('drive', 'v3', http=http,
+                         cache_discovery=False, static_discovery=True)
         except Exception as e:
             self.logger.log_error_with_context(e, {
                 "operation": "build_service",
@@ -44,12 +115,14 @@ class GoogleDriveClient:
                 'parents': [parent_id]
             }
             
-            folder = self.service.files().create(
+            folder = self._retry(lambda: self.service.files().create(
                 body=folder_metadata,
                 fields='id'
-            ).execute()
+            ).execute(), "create_folder", throttling_only=True)
             
             folder_id = folder.get('id')
+            if folder_id:
+                self._remember_folders({(parent_id, name): folder_id})
             self.logger.info(f"Created folder: {name}", folder_id=folder_id)
             return folder_id
             
@@ -68,16 +141,27 @@ class GoogleDriveClient:
             if not parent_id:
                 parent_id = self.config.google_drive_folder_id
             
+            cached_id = self._folder_cache.get((parent_id, name))
+            if cached_id:
+                return cached_id
+            
+            # Every child of a prefetched parent is already cached
+            if parent_id in self._prefetched_parents:
+                return self.create_folder(name, parent_id)
+            
             # Search for existing folder
-            query = f"name='{name}' and parents in '{parent_id}' and mimeType='application/vnd.google-apps.folder' and trashed=false"
-            results = self.service.files().list(
+            query = f"name='{_escape_q(name)}' and '{_escape_q(parent_id)}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
+            results = self._retry(lambda: self.service.files().list(
                 q=query,
                 fields="files(id, name)"
-            ).execute()
+            ).execute(), "get_or_create_folder")
             
-            files = results.get('files', [])
+            # Only trust an exact name match from the search
+            files = [f for f in results.get('files', []) if f['name'] == name]
             if files:
-                return files[0]['id']
+                folder_id = files[0]['id']
+                self._remember_folders({(parent_id, name): folder_id})
+                return folder_id
             else:
                 return self.create_folder(name, parent_id)
                 
@@ -89,9 +173,39 @@ class GoogleDriveClient:
             })
             return None
     
+    def _prefetch_children(self, parent_id: str):
+        """List all child folders of a parent into the folder cache."""
+        if parent_id in self._prefetched_parents:
+            return
+        
+        query = f"'{_escape_q(parent_id)}' in parents and mimeType='application/vnd.google-apps.folder' and trashed=false"
+        found = {}
+        page_token = None
+        while True:
+            results = self._retry(lambda: self.service.files().list(
+                q=query,
+                fields="nextPageToken, files(id, name)",
+                pageSize=1000,
+                pageToken=page_token
+            ).execute(), "prefetch_children")
+            
+            for folder in results.get('files', []):
+                key = (parent_id, folder['name'])
+                if key not in self._folder_cache and key not in found:
+                    found[key] = folder['id']
+            
+            page_token = results.get('nextPageToken')
+            if not page_token:
+                break
+        
+        self._remember_folders(found)
+        self._prefetched_parents.add(parent_id)
+    
     def upload_file(self, file_path: str, file_name: str, 
-                   parent_id: str, metadata: Dict[str, Any] = None) -> Optional[str]:
-        """Upload a file to Google Drive."""
+                   parent_id: str, metadata: Dict[str, Any] = None,
+                   content: Optional[bytes] = None,
+                   mimetype: Optional[str] = None) -> Optional[str]:
+        """Upload a file to Google Drive, from disk or from content in memory."""
         try:
             file_metadata = {
                 'name': file_name,
@@ -102,13 +216,20 @@ class GoogleDriveClient:
             if metadata:
                 file_metadata.update(metadata)
             
-            media = MediaFileUpload(file_path, resumable=True)
-            
-            file = self.service.files().create(
-                body=file_metadata,
-                media_body=media,
-                fields='id'
-            ).execute()
+            if content is not None:
+                # Small in-memory files fit in a single multipart request
+                media = MediaIoBaseUpload(
+                    io.BytesIO(content),
+                    mimetype=mimetype or 'application/octet-stream',
+                    resumable=False
+                )
+                file = self._retry(lambda: self.service.files().create(
+                    body=file_metadata,
+                    media_body=media,
+                    fields='id'
+                ).execute(), "upload_file", throttling_only=True)
+            else:
+                file = self._upload_resumable(file_path, file_metadata)
             
             file_id = file.get('id')
             self.logger.log_file_operation(
@@ -127,15 +248,81 @@ class GoogleDriveClient:
             })
             return None
     
+    def _upload_resumable(self, file_path: str, file_metadata: Dict[str, Any]) -> Dict[str, Any]:
+        """Upload a file from disk in large resumable chunks.
+        
+        A failed chunk is retried on its own; the upload resumes from the
+        last byte Drive acknowledged instead of starting over.
+        """
+        media = MediaFileUpload(
+            file_path,
+            chunksize=DRIVE_UPLOAD_CHUNK_SIZE,
+            resumable=True
+        )
+        request = self.service.files().create(
+            body=file_metadata,
+            media_body=media,
+            fields='id'
+        )
+        
+        response = None
+        while response is None:
+            status, response = self._retry(request.next_chunk, "upload_file")
+            if status:
+                self.logger.debug("Upload progress", file_path=file_path,
+                                  progress_percent=round(status.progress() * 100, 2))
+        return response
+    
+    def _execute_batch(self, requests: List[Tuple[str, HttpRequest]]) -> Dict[str, Any]:
+        """Execute requests in batched HTTP calls.
+        
+        Returns the response, or the HttpError raised, for each request id.
+        """
+        results = {}
+        
+        def on_response(request_id, response, exception):
+            results[request_id] = exception if exception is not None else response
+        
+        for start in range(0, len(requests), DRIVE_BATCH_SIZE):
+            batch = self.service.new_batch_http_request(callback=on_response)
+            for request_id, request in requests[start:start + DRIVE_BATCH_SIZE]:
+                batch.add(request, request_id=request_id)
+            batch.execute()
+        
+        return results
+    
+    def upload_file_async(self, file_path: str, file_name: str, 
+                          parent_id: str, metadata: Dict[str, Any] = None,
+                          content: Optional[bytes] = None,
+                          mimetype: Optional[str] = None) -> Future:
+        """Queue a file upload on the upload thread pool."""
+        return self._executor.submit(
+            self.upload_file, file_path, file_name, parent_id, metadata,
+            content, mimetype
+        )
+    
     def set_file_permissions(self, file_id: str, permissions: List[Dict[str, str]]) -> bool:
         """Set permissions for a file."""
         try:
-            for permission in permissions:
-                self.service.permissions().create(
+            results = self._execute_batch([
+                (str(index), self.service.permissions().create(
                     fileId=file_id,
                     body=permission
-                ).execute()
-            return True
+                ))
+                for index, permission in enumerate(permissions)
+            ])
+            
+            failed = False
+            for request_id, result in results.items():
+                if isinstance(result, HttpError):
+                    failed = True
+                    self.logger.log_error_with_context(result, {
+                        "operation": "set_file_permissions",
+                        "file_id": file_id,
+                        "permission": permissions[int(request_id)],
+                        "error_code": result.resp.status
+                    })
+            return not failed
         except HttpError as e:
             self.logger.log_error_with_context(e, {
                 "operation": "set_file_permissions",
@@ -147,10 +334,10 @@ class GoogleDriveClient:
     def add_file_description(self, file_id: str, description: str) -> bool:
         """Add description to a file."""
         try:
-            self.service.files().update(
+            self._retry(lambda: self.service.files().update(
                 fileId=file_id,
                 body={'description': description}
-            ).execute()
+            ).execute(), "add_file_description")
             return True
         except HttpError as e:
             self.logger.log_error_with_context(e, {
@@ -160,26 +347,68 @@ class GoogleDriveClient:
             })
             return False
     
+    def _create_folders(self, names: List[str], parent_id: str):
+        """Create several folders under one parent in batched calls."""
+        results = self._execute_batch([
+            (str(index), self.service.files().create(
+                body={
+                    'name': name,
+                    'mimeType': 'application/vnd.google-apps.folder',
+                    'parents': [parent_id]
+                },
+                fields='id'
+            ))
+            for index, name in enumerate(names)
+        ])
+        
+        created = {}
+        for request_id, result in results.items():
+            name = names[int(request_id)]
+            if isinstance(result, HttpError):
+                self.logger.log_error_with_context(result, {
+                    "operation": "create_folders",
+                    "name": name,
+                    "parent_id": parent_id,
+                    "error_code": result.resp.status
+                })
+            elif result.get('id'):
+                created[(parent_id, name)] = result['id']
+                self.logger.info(f"Created folder: {name}", folder_id=result['id'])
+        
+        self._remember_folders(created)
+    
     def create_channel_folder_structure(self, channel_name: str, 
                                       user_folders: List[str] = None) -> Optional[str]:
         """Create folder structure for a Slack channel."""
         try:
+            root_id = self.config.google_drive_folder_id
+            channel_folder_name = f"Slack - {channel_name}"
+            
+            # One listing of the root resolves every channel folder not
+            # already known from an earlier run
+            if (root_id, channel_folder_name) not in self._folder_cache:
+                self._prefetch_children(root_id)
+            
             # Create main channel folder
-            channel_folder_id = self.get_or_create_folder(
-                f"Slack - {channel_name}",
-                self.config.google_drive_folder_id
-            )
+            channel_folder_id = self.get_or_create_folder(channel_folder_name, root_id)
             
             if not channel_folder_id:
                 return None
             
             # Create user subfolders if provided
             if user_folders:
-                for user_name in user_folders:
-                    self.get_or_create_folder(
-                        user_name,
-                        channel_folder_id
-                    )
+                missing = [
+                    user_name for user_name in dict.fromkeys(user_folders)
+                    if (channel_folder_id, user_name) not in self._folder_cache
+                ]
+                if missing:
+                    self._prefetch_children(channel_folder_id)
+                    missing = [
+                        user_name for user_name in missing
+                        if (channel_folder_id, user_name) not in self._folder_cache
+                    ]
+                if missing:
+                    self._create_folders(missing, channel_folder_id)
             
             return channel_folder_id
             
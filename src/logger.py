@@ -1,11 +1,64 @@
 """Logging configuration for the Slack Archive Migration tool."""
 
 import os
+import atexit
+import queue
 import logging
+import logging.handlers
 import structlog
 from typing import Any, Dict
 from src.config import Config
 
+LOG_FORMAT = '%(asctime)s - %(name)s - %(levelname)s - %(message)s'
+
+class _DeferredQueueHandler(logging.handlers.QueueHandler):
+    """Queue handler that leaves formatting to the listener thread."""
+    
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        # The stock handler renders the message here, in the caller's
+        # thread; structlog records carry their event dict until then
+        return record
+
+_json_renderer = structlog.processors.JSONRenderer()
+
+def _render_event(logger: Any, method_name: str, event_dict: Dict[str, Any]) -> str:
+    """Render structlog events as JSON and other libraries' records as plain text."""
+    from_structlog = event_dict.pop('_from_structlog', False)
+    event_dict.pop('_record', None)
+    if not from_structlog:
+        return event_dict['event']
+    return _json_renderer(logger, method_name, event_dict)
+
+_listener = None
+_listener_running = False
+
+def _stop_listener() -> None:
+    """Flush queued records and stop the current listener thread."""
+    global _listener_running
+    if _listener_running:
+        _listener.stop()
+        _listener_running = False
+
+def _restart_listener_after_fork() -> None:
+    """Give a forked process its own log queue and listener thread."""
+    # The parent's listener thread does not exist in the child, so
+    # records put on the inherited queue would never be written
+    global _listener, _listener_running
+    if _listener is None:
+        return
+    log_queue = queue.SimpleQueue()
+    for handler in logging.getLogger().handlers:
+        if isinstance(handler, _DeferredQueueHandler):
+            handler.queue = log_queue
+    _listener = logging.handlers.QueueListener(
+        log_queue, *_listener.handlers, respect_handler_level=True
+    )
+    _listener.start()
+    _listener_running = True
+
+atexit.register(_stop_listener)
+os.register_at_fork(after_in_child=_restart_listener_after_fork)
+
 def setup_logging(config: Config) -> None:
     """Set up structured logging with the given configuration."""
     
@@ -13,14 +66,37 @@ def setup_logging(config: Config) -> None:
     log_file = config.log_file
     os.makedirs(os.path.dirname(log_file), exist_ok=True)
     
+    global _listener, _listener_running
+    
+    # Rendering and writing to disk happen on one background thread;
+    # callers only put records on the queue. Records from other libraries
+    # keep their plain message and traceback
+    formatter = structlog.stdlib.ProcessorFormatter(
+        processors=[_render_event],
+        fmt=LOG_FORMAT,
+        keep_exc_info=True,
+        keep_stack_info=True
+    )
+    output_handlers = [
+        logging.FileHandler(log_file),
+        logging.StreamHandler()
+    ]
+    for handler in output_handlers:
+        handler.setFormatter(formatter)
+    
+    _stop_listener()
+    log_queue = queue.SimpleQueue()
+    _listener = logging.handlers.QueueListener(
+        log_queue, *output_handlers, respect_handler_level=True
+    )
+    _listener.start()
+    _listener_running = True
+    
     # Configure standard library logging
     logging.basicConfig(
         level=getattr(logging, config.log_level.upper()),
-        format='%(asctime)s - %(name)s - %(levelname)s - %(message)s',
-        handlers=[
-            logging.FileHandler(log_file),
-            logging.StreamHandler()
-        ]
+        handlers=[_DeferredQueueHandler(log_queue)],
+        force=True
     )
     
     # Configure structlog
@@ -34,7 +110,7 @@ def setup_logging(config: Config) -> None:
             structlog.processors.StackInfoRenderer(),
             structlog.processors.format_exc_info,
             structlog.processors.UnicodeDecoder(),
-            structlog.processors.JSONRenderer()
+            structlog.stdlib.ProcessorFormatter.wrap_for_formatter
         ],
         context_class=dict,
         logger_factory=structlog.stdlib.LoggerFactory(),
@@ -1,16 +1,43 @@
 """Main migration orchestrator that coordinates the entire migration process."""
 
 import asyncio
+import mimetypes
 import os
+import time
+from dataclasses import dataclass, field
 from typing import List, Dict, Any, Optional
 from datetime import datetime
 from src.config import Config
 from src.logger import MigrationLogger
-from src.database import DatabaseManager, FileRecord
+from src.database import BULK_INSERT_CHUNK_SIZE, DatabaseManager, FileRecord
 from src.slack_client import SlackClient
 from src.google_drive_client import GoogleDriveClient
 from src.ai_analyzer import AIAnalyzer
 
+# File types analyzed with the Vision and Video Intelligence APIs
+IMAGE_FILE_TYPES = frozenset({'jpg', 'jpeg', 'png', 'gif', 'webp'})
+VIDEO_FILE_TYPES = frozenset({'mp4', 'mov', 'avi', 'webm', 'mkv'})
+
+# sync_state keys used to resume and narrow the Slack catalog
+CATALOG_PAGE_KEY = 'catalog_page'
+CATALOG_TS_FROM_KEY = 'catalog_ts_from'
+CATALOG_STARTED_KEY = 'catalog_started'
+CATALOG_WATERMARK_KEY = 'catalog_watermark'
+
+# Incremental catalogs reach this far behind the previous catalog's start,
+# so files are not missed if the local and Slack clocks disagree
+CATALOG_WATERMARK_OVERLAP_SECONDS = 300
+
+@dataclass
+class _PipelineItem:
+    """A file moving through the migration pipeline."""
+    file_record: FileRecord
+    download_path: str
+    tags: List[Dict[str, Any]] = field(default_factory=list)
+    # Set when the file is small enough to skip the disk entirely
+    content: Optional[bytes] = None
+    mimetype: Optional[str] = None
+
 class MigrationOrchestrator:
     """Orchestrates the complete migration process."""
     
@@ -19,9 +46,18 @@ class MigrationOrchestrator:
         self.logger = MigrationLogger("migration_orchestrator")
         self.db = DatabaseManager(config.database_path)
         self.slack_client = SlackClient(config)
-        self.drive_client = GoogleDriveClient(config)
+        self.drive_client = GoogleDriveClient(config, self.db)
         self.ai_analyzer = AIAnalyzer(config)
         
+        # File type -> analysis step; other types are migrated untagged
+        self._analyzers = {
+            **dict.fromkeys(IMAGE_FILE_TYPES, self._analyze_image),
+            **dict.fromkeys(VIDEO_FILE_TYPES, self._analyze_video),
+        }
+        
+        # Slack user ID -> user name, filled in by _create_drive_structure
+        self.user_lookup: Dict[str, str] = {}
+        
         # Create necessary directories
         os.makedirs("downloads", exist_ok=True)
         os.makedirs("logs", exist_ok=True)
@@ -35,6 +71,16 @@ class MigrationOrchestrator:
             # Step 1: Fetch and catalog all files from Slack
             await self._catalog_slack_files()
             
+            # Nothing new since the last run and nothing left over from it
+            if self.config.incremental_sync and not self.db.get_pending_files(limit=1):
+                final_stats = self.db.get_migration_stats()
+                self.logger.info("No new files to migrate", **final_stats)
+                return {
+                    "status": "completed",
+                    "stats": final_stats,
+                    "migration_results": {"successful": 0, "failed": 0, "errors": []}
+                }
+            
             # Step 2: Create folder structure in Google Drive
             await self._create_drive_structure()
             
@@ -57,58 +103,118 @@ class MigrationOrchestrator:
                 "status": "failed",
                 "error": str(e)
             }
+        finally:
+            await self.close()
+    
+    async def close(self):
+        """Release network resources held by the API clients."""
+        await self.slack_client.close()
+        await asyncio.to_thread(self.drive_client.close)
     
     async def _catalog_slack_files(self):
-        """Catalog all files from Slack and store in database."""
+        """Catalog all files from Slack and store in database.
+        
+        An interrupted catalog resumes from the last saved page number. In
+        incremental mode only files created since the last completed catalog
+        started are listed; files recorded by the webhook do not count.
+        """
         self.logger.info("Cataloging Slack files")
         
+        page = self.db.get_sync_state(CATALOG_PAGE_KEY)
+        if page:
+            # Resume with the same time window and start time the
+            # interrupted catalog used
+            ts_from = self.db.get_sync_state(CATALOG_TS_FROM_KEY)
+            ts_from = int(ts_from) if ts_from else None
+            started_at = int(self.db.get_sync_state(CATALOG_STARTED_KEY) or time.time())
+            self.logger.info("Resuming interrupted Slack catalog")
+        else:
+            watermark = self.db.get_sync_state(CATALOG_WATERMARK_KEY) if self.config.incremental_sync else None
+            ts_from = max(int(watermark) - CATALOG_WATERMARK_OVERLAP_SECONDS, 0) if watermark else None
+            started_at = int(time.time())
+            self.db.set_sync_state(CATALOG_TS_FROM_KEY, str(ts_from or ''))
+            self.db.set_sync_state(CATALOG_STARTED_KEY, str(started_at))
+        
         file_count = 0
-        async for file_info in self.slack_client.get_all_files():
-            try:
-                # Create file record
-                file_record = FileRecord(
-                    id=file_info['id'],
-                    slack_file_id=file_info['id'],
-                    slack_channel_id=file_info.get('channels', [''])[0],
-                    slack_user_id=file_info['user'],
-                    file_name=file_info['name'],
-                    file_type=file_info['filetype'],
-                    file_size=file_info['size'],
-                    upload_timestamp=datetime.fromtimestamp(file_info['timestamp'])
-                )
-                
-                # Save to database
-                self.db.add_file_record(file_record)
-                file_count += 1
-                
-                if file_count % 100 == 0:
-                    self.logger.log_migration_progress(
-                        total=file_count, 
-                        processed=file_count,
-                        current_file=file_info['name']
-                    )
+        batch: List[FileRecord] = []
+        complete = False
+        async for files, next_page in self.slack_client.get_file_pages(
+                ts_from=ts_from, page=int(page) if page else 1):
+            for file_info in files:
+                try:
+                    # Create file record
+                    batch.append(FileRecord(
+                        id=file_info['id'],
+                        slack_file_id=file_info['id'],
+                        slack_channel_id=file_info.get('channels', [''])[0],
+                        slack_user_id=file_info['user'],
+                        file_name=file_info['name'],
+                        file_type=file_info['filetype'],
+                        file_size=file_info['size'],
+                        upload_timestamp=datetime.fromtimestamp(file_info['timestamp']),
+                        url_private_download=file_info.get('url_private_download')
+                    ))
+                    file_count += 1
                     
-            except Exception as e:
-                self.logger.log_error_with_context(e, {
-                    "operation": "catalog_slack_files",
-                    "file_id": file_info.get('id', 'unknown')
-                })
+                    if file_count % 100 == 0:
+                        self.logger.log_migration_progress(
+                            total=file_count, 
+                            processed=file_count,
+                            current_file=file_info['name']
+                        )
+                        
+                except Exception as e:
+                    self.logger.log_error_with_context(e, {
+                        "operation": "catalog_slack_files",
+                        "file_id": file_info.get('id', 'unknown')
+                    })
+            
+            complete = next_page is None
+            # Save to database in bulk, only on page boundaries so the saved
+            # page never points past files that are not stored yet
+            if len(batch) >= BULK_INSERT_CHUNK_SIZE or complete:
+                if not self._save_catalog_batch(batch, next_page):
+                    # The saved page still points at the first unsaved
+                    # page, so the next run lists these files again
+                    complete = False
+                    batch.clear()
+                    break
+        
+        # Listing stopped early on an error; keep what was listed
+        if batch:
+            self._save_catalog_batch(batch, next_page)
+        if complete:
+            # The watermark only moves once a catalog has seen every page
+            self.db.set_sync_state(CATALOG_WATERMARK_KEY, str(started_at))
+            self.db.set_sync_state(CATALOG_PAGE_KEY, None)
         
         self.logger.info(f"Cataloged {file_count} files from Slack")
     
+    def _save_catalog_batch(self, batch: List[FileRecord], next_page: Optional[int]) -> bool:
+        """Store cataloged records, then the number of the next page to list."""
+        if not self.db.add_file_records(batch):
+            return False
+        batch.clear()
+        if next_page:
+            self.db.set_sync_state(CATALOG_PAGE_KEY, str(next_page))
+        return True
+    
     async def _create_drive_structure(self):
         """Create folder structure in Google Drive."""
         self.logger.info("Creating Google Drive folder structure")
         
         try:
             # Get channels and users from Slack
-            channels = await self.slack_client.get_channels()
-            users = await self.slack_client.get_users()
+            channels, users = await asyncio.gather(
+                self.slack_client.get_channels(),
+                self.slack_client.get_users()
+            )
             
-            # Create user lookup
-            user_lookup = {user['id']: user['name'] for user in users}
+            # Create user lookup, kept for mapping files to folders
+            self.user_lookup = {user['id']: user['name'] for user in users}
             
             # Create folder structure for each channel
+            channel_folders = []
             for channel in channels:
                 channel_name = channel['name']
                 channel_folder_id = self.drive_client.create_channel_folder_structure(
@@ -116,115 +222,207 @@ class MigrationOrchestrator:
                 )
                 
                 if channel_folder_id:
-                    # Store channel folder mapping in database
-                    # This would be implemented in the database module
-                    pass
-                    
+                    channel_folders.append((channel['id'], channel_name, channel_folder_id))
+            
+            # Store channel folder mapping in database
+            if channel_folders:
+                self.db.add_channel_folders(channel_folders)
+            
         except Exception as e:
             self.logger.log_error_with_context(e, {"operation": "create_drive_structure"})
     
     async def _migrate_files(self) -> Dict[str, Any]:
-        """Migrate files with AI analysis."""
+        """Migrate files with AI analysis.
+        
+        Files flow through a download -> analyze -> upload pipeline with
+        a pool of workers per stage, so one file can be uploading while
+        the next is being analyzed and a third is downloading.
+        """
         self.logger.info("Starting file migration with AI analysis")
         
-        pending_files = self.db.get_pending_files(limit=self.config.batch_size)
         results = {
             "successful": 0,
             "failed": 0,
             "errors": []
         }
         
-        for file_record in pending_files:
-            try:
-                # Download file from Slack
-                download_path = f"downloads/{file_record.id}_{file_record.file_name}"
-                success = await self._download_and_analyze_file(file_record, download_path)
+        workers = self.config.max_concurrent_migrations
+        download_q = asyncio.Queue(maxsize=workers)
+        analyze_q = asyncio.Queue(maxsize=workers)
+        upload_q = asyncio.Queue(maxsize=workers)
+        stages = [
+            (download_q, self._download_stage, analyze_q),
+            (analyze_q, self._analyze_stage, upload_q),
+            (upload_q, self._upload_stage, None),
+        ]
+        tasks = [
+            asyncio.create_task(self._pipeline_worker(in_q, stage, out_q, results))
+            for in_q, stage, out_q in stages
+            for _ in range(workers)
+        ]
+        
+        try:
+            # Feed the pending files in one batch at a time
+            after = None
+            while True:
+                pending_files = self.db.get_pending_files(
+                    after=after, limit=self.config.batch_size
+                )
+                if not pending_files:
+                    break
                 
-                if success:
+                for file_record in pending_files:
+                    await download_q.put(self._new_pipeline_item(file_record))
+                
+                after = pending_files[-1]
+            
+            # Each stage hands items on before marking them done, so
+            # draining the queues in order waits for every file
+            for queue in (download_q, analyze_q, upload_q):
+                await queue.join()
+        finally:
+            for task in tasks:
+                task.cancel()
+            await asyncio.gather(*tasks, return_exceptions=True)
+        
+        return results
+    
+    async def migrate_file(self, file_record: FileRecord) -> bool:
+        """Download, analyze and upload a single file."""
+        item = self._new_pipeline_item(file_record)
+        try:
+            # Already migrated, failed or unknown; nothing to do
+            if file_record.id not in self.db.get_pending_file_ids([file_record.id]):
+                self.logger.info(f"Skipping file not pending migration: {file_record.file_name}",
+                                 file_id=file_record.id)
+                return False
+            
+            for stage in (self._download_stage, self._analyze_stage, self._upload_stage):
+                if not await stage(item):
+                    return False
+            return True
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "migrate_file",
+                "file_id": file_record.id
+            })
+            return False
+    
+    def _new_pipeline_item(self, file_record: FileRecord) -> "_PipelineItem":
+        """Start a file's trip through the pipeline."""
+        return _PipelineItem(file_record, f"downloads/{file_record.id}_{file_record.file_name}")
+    
+    async def _pipeline_worker(self, in_q: asyncio.Queue, stage, 
+                               out_q: Optional[asyncio.Queue], 
+                               results: Dict[str, Any]):
+        """Run items from in_q through a stage and pass successes to out_q."""
+        while True:
+            item = await in_q.get()
+            try:
+                if not await stage(item):
+                    results["failed"] += 1
+                elif out_q is None:
                     results["successful"] += 1
                 else:
-                    results["failed"] += 1
-                    
+                    await out_q.put(item)
             except Exception as e:
                 self.logger.log_error_with_context(e, {
                     "operation": "migrate_files",
-                    "file_id": file_record.id
+                    "stage": stage.__name__,
+                    "file_id": item.file_record.id
                 })
                 results["failed"] += 1
                 results["errors"].append(str(e))
-        
-        return results
+            finally:
+                in_q.task_done()
     
-    async def _download_and_analyze_file(self, file_record: FileRecord, 
-                                       download_path: str) -> bool:
-        """Download file and perform AI analysis."""
-        try:
-            # Get file info from Slack
+    async def _download_stage(self, item: "_PipelineItem") -> bool:
+        """Download a file from Slack."""
+        file_record = item.file_record
+        
+        # The URL is normally cataloged from files.list; only records
+        # cataloged before that need a files.info lookup
+        download_url = file_record.url_private_download
+        if not download_url:
             file_info = await self.slack_client.get_file_info(file_record.slack_file_id)
             if not file_info:
                 return False
-            
-            # Download file
-            download_success = await self.slack_client.download_file(
-                file_info['url_private_download'],
-                download_path
-            )
-            
-            if not download_success:
-                return False
-            
-            # Perform AI analysis
-            tags = []
-            if file_record.file_type in ['jpg', 'jpeg', 'png', 'gif']:
-                tags = self.ai_analyzer.analyze_image(download_path)
-            elif file_record.file_type in ['mp4', 'mov', 'avi', 'webm']:
-                tags = self.ai_analyzer.analyze_video(download_path)
-            
-            # Upload to Google Drive
-            folder_id = self._get_target_folder_id(file_record)
-            if not folder_id:
-                return False
-            
-            # Create metadata for Google Drive
-            metadata = {
-                'description': self.ai_analyzer.generate_file_description(
-                    tags, file_record.file_type
-                ),
-                'properties': {
-                    'slack_channel': file_record.slack_channel_id,
-                    'slack_user': file_record.slack_user_id,
-                    'upload_timestamp': file_record.upload_timestamp.isoformat(),
-                    'original_name': file_record.file_name
-                }
+            download_url = file_info['url_private_download']
+        
+        # Small images are sent to Vision inline and uploaded to Drive
+        # in one request, so keep them in memory instead of on disk
+        if (file_record.file_type in IMAGE_FILE_TYPES
+                and file_record.file_size <= self.config.vision_inline_max_bytes):
+            item.content = await self.slack_client.download_file_content(download_url)
+            item.mimetype = mimetypes.guess_type(file_record.file_name)[0]
+            return item.content is not None
+        
+        # Download file
+        return await self.slack_client.download_file(download_url, item.download_path)
+    
+    async def _analyze_stage(self, item: "_PipelineItem") -> bool:
+        """Tag a downloaded file with AI analysis."""
+        analyze = self._analyzers.get(item.file_record.file_type)
+        if analyze is not None:
+            item.tags = await analyze(item)
+        return True
+    
+    async def _analyze_image(self, item: "_PipelineItem") -> List[Dict[str, Any]]:
+        """Tag an image; concurrent calls share Vision batch requests."""
+        return await self.ai_analyzer.analyze_image(item.download_path, item.content)
+    
+    async def _analyze_video(self, item: "_PipelineItem") -> List[Dict[str, Any]]:
+        """Tag a video."""
+        return await self.ai_analyzer.analyze_video(item.download_path)
+    
+    async def _upload_stage(self, item: "_PipelineItem") -> bool:
+        """Upload a file to Google Drive and record the migration."""
+        file_record = item.file_record
+        
+        # Upload to Google Drive
+        folder_id = self._get_target_folder_id(file_record)
+        if not folder_id:
+            return False
+        
+        # Create metadata for Google Drive
+        metadata = {
+            'description': self.ai_analyzer.generate_file_description(
+                item.tags, file_record.file_type
+            ),
+            'properties': {
+                'slack_channel': file_record.slack_channel_id,
+                'slack_user': file_record.slack_user_id,
+                'upload_timestamp': file_record.upload_timestamp.isoformat(),
+                'original_name': file_record.file_name
             }
-            
-            # Upload file
-            drive_file_id = self.drive_client.upload_file(
-                download_path,
+        }
+        
+        # Upload on the Drive client's thread pool, off the event loop
+        drive_file_id = await asyncio.wrap_future(
+            self.drive_client.upload_file_async(
+                item.download_path,
                 file_record.file_name,
                 folder_id,
-                metadata
+                metadata,
+                item.content,
+                item.mimetype
             )
-            
-            if drive_file_id:
-                # Update database
-                self.db.update_file_migration_status(
-                    file_record.id, "completed", drive_file_id
-                )
-                self.db.update_file_tags(file_record.id, tags)
-                
-                # Clean up downloaded file
-                os.remove(download_path)
-                return True
-            
-            return False
-            
-        except Exception as e:
-            self.logger.log_error_with_context(e, {
-                "operation": "download_and_analyze_file",
-                "file_id": file_record.id
-            })
+        )
+        
+        if not drive_file_id:
             return False
+        
+        # Update database in a single commit; raising inside the block
+        # rolls back a status update whose tags failed to save
+        with self.db.transaction():
+            if not (self.db.update_file_migration_status(file_record.id, "completed", drive_file_id)
+                    and self.db.update_file_tags(file_record.id, item.tags)):
+                raise RuntimeError(f"Failed to record migration of {file_record.id}")
+        
+        # Clean up downloaded file
+        if item.content is None:
+            await asyncio.to_thread(os.remove, item.download_path)
+        return True
     
     def _get_target_folder_id(self, file_record: FileRecord) -> Optional[str]:
         """Get the target folder ID for a file."""
@@ -0,0 +1,115 @@
+"""Exponential-backoff retry helpers for Slack and Google API calls."""
+
+import asyncio
+import random
+import time
+from typing import Awaitable, Callable, Optional, Tuple, TypeVar
+
+import aiohttp
+from googleapiclient.errors import HttpError
+from slack_sdk.errors import SlackApiError
+from src.logger import MigrationLogger
+
+# Statuses that signal throttling or a transient server failure
+RETRIABLE_STATUSES = frozenset({429, 500, 502, 503, 504})
+MAX_BACKOFF_SECONDS = 60
+
+# Google reports per-user and per-project rate limits as 403 with one of
+# these reasons; the request was rejected, so it is safe to send again
+RATE_LIMIT_REASONS = frozenset({'rateLimitExceeded', 'userRateLimitExceeded'})
+
+T = TypeVar('T')
+
+logger = MigrationLogger("retry")
+
+def _is_rate_limited(error: HttpError) -> bool:
+    """Check whether a Google API error is a rate limit rejection."""
+    if error.resp.status == 429:
+        return True
+    if error.resp.status != 403 or not isinstance(error.error_details, list):
+        return False
+    return any(
+        isinstance(detail, dict) and detail.get('reason') in RATE_LIMIT_REASONS
+        for detail in error.error_details
+    )
+
+def _classify_error(error: BaseException, throttling_only: bool = False) -> Tuple[bool, Optional[float]]:
+    """Return whether an error is transient and the server's Retry-After hint.
+    
+    With throttling_only, only rate limit rejections count as transient;
+    server and connection errors may have hidden a request that succeeded.
+    """
+    if isinstance(error, HttpError):
+        status, headers = error.resp.status, error.resp
+        if _is_rate_limited(error):
+            status = 429
+    elif isinstance(error, SlackApiError):
+        status, headers = error.response.status_code, error.response.headers or {}
+    elif isinstance(error, aiohttp.ClientResponseError):
+        status, headers = error.status, error.headers or {}
+    elif isinstance(error, (aiohttp.ClientConnectionError, asyncio.TimeoutError, ConnectionError)):
+        return not throttling_only, None
+    else:
+        return False, None
+    
+    if status != 429 and (throttling_only or status not in RETRIABLE_STATUSES):
+        return False, None
+    
+    retry_after = headers.get('Retry-After') or headers.get('retry-after')
+    try:
+        return True, float(retry_after) if retry_after else None
+    except (TypeError, ValueError):
+        return True, None
+
+def _backoff_delay(attempt: int, base_delay: float, retry_after: Optional[float]) -> float:
+    """Get the delay before the next attempt, preferring the server's hint."""
+    if retry_after is not None:
+        return min(retry_after, MAX_BACKOFF_SECONDS)
+    return min(base_delay * 2 ** attempt + random.random(), MAX_BACKOFF_SECONDS)
+
+def _next_delay(error: Exception, attempt: int, max_attempts: int,
+                base_delay: float, operation: str,
+                throttling_only: bool = False) -> Optional[float]:
+    """Get the delay before retrying, or None if the error should be raised."""
+    transient, retry_after = _classify_error(error, throttling_only)
+    if not transient or attempt >= max_attempts - 1:
+        return None
+    
+    delay = _backoff_delay(attempt, base_delay, retry_after)
+    logger.warning(
+        f"Transient error in {operation}, retrying",
+        operation=operation,
+        attempt=attempt + 1,
+        delay_seconds=round(delay, 2),
+        error_message=str(error)
+    )
+    return delay
+
+def retry_with_backoff(fn: Callable[[], T], *, max_attempts: int,
+                       base_delay: float, operation: str,
+                       throttling_only: bool = False) -> T:
+    """Call fn, retrying transient API errors with exponential backoff.
+    
+    Pass throttling_only for requests that are not idempotent, so that
+    only rate limit rejections are retried.
+    """
+    for attempt in range(max_attempts):
+        try:
+            return fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_attempts, base_delay, operation, throttling_only)
+            if delay is None:
+                raise
+            time.sleep(delay)
+
+async def async_retry_with_backoff(fn: Callable[[], Awaitable[T]], *, max_attempts: int,
+                                   base_delay: float, operation: str) -> T:
+    """Await fn(), retrying transient API errors with exponential backoff."""
+    for attempt in range(max_attempts):
+        try:
+            return await fn()
+        except Exception as e:
+            delay = _next_delay(e, attempt, max_attempts, base_delay, operation)
+            if delay is None:
+                raise
+            await asyncio.sleep(delay)
@@ -1,55 +1,129 @@
 """Slack API client for fetching files and metadata."""
 
 import asyncio
+import io
+import time
 import aiohttp
-from typing import List, Dict, Any, Optional, AsyncGenerator
-from slack_sdk.web import WebClient
+import aiofiles
+from typing import List, Dict, Any, Optional, AsyncGenerator, Tuple
+from slack_sdk.web.async_client import AsyncWebClient
 from slack_sdk.errors import SlackApiError
 from src.logger import MigrationLogger
 from src.config import Config
+from src.retry import RETRIABLE_STATUSES, async_retry_with_backoff
+
+# Connection pool shared by all file downloads
+HTTP_POOL_SIZE = 64
+HTTP_POOL_SIZE_PER_HOST = 16
+DNS_CACHE_TTL_SECONDS = 300
+
+# Files requested per files.list page
+FILES_PAGE_SIZE = 200
+
+# Channels and users change slowly, so lists are reused for a while
+METADATA_CACHE_TTL_SECONDS = 300
+
+# Read size for streaming file downloads
+DOWNLOAD_CHUNK_SIZE = 64 * 1024
 
 class SlackClient:
     """Client for interacting with Slack API."""
     
     def __init__(self, config: Config):
         self.config = config
-        self.client = WebClient(token=config.slack_token)
         self.logger = MigrationLogger("slack_client")
+        self._session: Optional[aiohttp.ClientSession] = None
+        self._client: Optional[AsyncWebClient] = None
+        # method name -> (fetched_at, items) for channel and user lists
+        self._metadata_cache: Dict[str, Tuple[float, List[Dict[str, Any]]]] = {}
+    
+    async def _get_session(self) -> aiohttp.ClientSession:
+        """Get the shared HTTP session, creating it on first use."""
+        if self._session is None or self._session.closed:
+            self._session = aiohttp.ClientSession(
+                connector=aiohttp.TCPConnector(
+                    limit=HTTP_POOL_SIZE,
+                    limit_per_host=HTTP_POOL_SIZE_PER_HOST,
+                    ttl_dns_cache=DNS_CACHE_TTL_SECONDS
+                )
+            )
+        return self._session
+    
+    async def _get_client(self) -> AsyncWebClient:
+        """Get the Slack Web API client bound to the shared session."""
+        session = await self._get_session()
+        if self._client is None or self._client.session is not session:
+            self._client = AsyncWebClient(
+                token=self.config.slack_token,
+                session=session
+            )
+        return self._client
+    
+    async def _retry(self, fn, operation: str):
+        """Await a Slack request, retrying rate limits and server errors."""
+        return await async_retry_with_backoff(
+            fn,
+            max_attempts=self.config.retry_attempts + 1,
+            base_delay=self.config.retry_delay_seconds,
+            operation=operation
+        )
     
-    async def get_all_files(self, file_types: List[str] = None) -> AsyncGenerator[Dict[str, Any], None]:
+    async def close(self):
+        """Close the shared HTTP session."""
+        if self._session is not None and not self._session.closed:
+            await self._session.close()
+        self._session = None
+        self._client = None
+    
+    async def get_all_files(self, file_types: List[str] = None,
+                            ts_from: Optional[int] = None) -> AsyncGenerator[Dict[str, Any], None]:
         """Get all files from Slack with pagination."""
+        async for files, _ in self.get_file_pages(file_types, ts_from):
+            for file_info in files:
+                yield file_info
+    
+    async def get_file_pages(self, file_types: List[str] = None,
+                             ts_from: Optional[int] = None,
+                             page: int = 1
+                             ) -> AsyncGenerator[Tuple[List[Dict[str, Any]], Optional[int]], None]:
+        """Get pages of files from Slack with the number of the next page.
+        
+        Only files created at or after ts_from are listed when it is set.
+        The last page of a complete listing has no next page number;
+        a listing cut short by an error stops without one.
+        """
         if not file_types:
             file_types = self.config.file_types
         
-        page = 1
         while True:
             try:
-                response = await self._get_files_page(page, file_types)
-                files = response.get('files', [])
-                
-                if not files:
-                    break
-                
-                for file_info in files:
-                    yield file_info
-                
-                page += 1
-                
+                response = await self._get_files_page(page, file_types, ts_from)
             except Exception as e:
                 self.logger.log_error_with_context(e, {
-                    "operation": "get_all_files",
+                    "operation": "get_file_pages",
                     "page": page
                 })
                 break
+            
+            files = response.get('files', [])
+            page_count = response.get('paging', {}).get('pages', 0)
+            next_page = page + 1 if files and page < page_count else None
+            yield files, next_page
+            if next_page is None:
+                break
+            page = next_page
     
-    async def _get_files_page(self, page: int, file_types: List[str]) -> Dict[str, Any]:
+    async def _get_files_page(self, page: int, file_types: List[str],
+                              ts_from: Optional[int] = None) -> Dict[str, Any]:
         """Get a page of files from Slack."""
         try:
-            response = self.client.files_list(
+            client = await self._get_client()
+            response = await self._retry(lambda: client.files_list(
                 page=page,
                 types=','.join(file_types),
-                count=200  # Maximum per page
-            )
+                count=FILES_PAGE_SIZE,
+                ts_from=ts_from
+            ), "files_list")
             return response.data
         except SlackApiError as e:
             self.logger.log_error_with_context(e, {
@@ -62,7 +136,10 @@ class SlackClient:
     async def get_file_info(self, file_id: str) -> Optional[Dict[str, Any]]:
         """Get detailed information about a specific file."""
         try:
-            response = self.client.files_info(file=file_id)
+            client = await self._get_client()
+            response = await self._retry(
+                lambda: client.files_info(file=file_id), "files_info"
+            )
             return response.data['file']
         except SlackApiError as e:
             self.logger.log_error_with_context(e, {
@@ -72,19 +149,37 @@ class SlackClient:
             })
             return None
     
+    async def _fetch_file(self, file_url: str, write_body, operation: str) -> bool:
+        """Fetch a Slack file with retries, handing its body chunks to write_body.
+        
+        write_body is awaited with the chunk iterator on every attempt, so
+        it must start its output afresh each time.
+        """
+        session = await self._get_session()
+        # Private file URLs need the bot token
+        headers = {'Authorization': f"Bearer {self.config.slack_token}"}
+        
+        async def fetch() -> bool:
+            async with session.get(file_url, headers=headers) as response:
+                if response.status in RETRIABLE_STATUSES:
+                    response.raise_for_status()
+                if response.status != 200:
+                    self.logger.warning(f"Failed to download file: HTTP {response.status}")
+                    return False
+                await write_body(response.content.iter_chunked(DOWNLOAD_CHUNK_SIZE))
+                return True
+        
+        return await self._retry(fetch, operation)
+    
     async def download_file(self, file_url: str, file_path: str) -> bool:
         """Download a file from Slack."""
+        async def write_to_disk(chunks):
+            async with aiofiles.open(file_path, 'wb') as f:
+                async for chunk in chunks:
+                    await f.write(chunk)
+        
         try:
-            async with aiohttp.ClientSession() as session:
-                async with session.get(file_url) as response:
-                    if response.status == 200:
-                        with open(file_path, 'wb') as f:
-                            async for chunk in response.content.iter_chunked(8192):
-                                f.write(chunk)
-                        return True
-                    else:
-                        self.logger.warning(f"Failed to download file: HTTP {response.status}")
-                        return False
+            return await self._fetch_file(file_url, write_to_disk, "download_file")
         except Exception as e:
             self.logger.log_error_with_context(e, {
                 "operation": "download_file",
@@ -93,14 +188,52 @@ class SlackClient:
             })
             return False
     
+    async def download_file_content(self, file_url: str) -> Optional[bytes]:
+        """Download a file from Slack into memory."""
+        buffer = io.BytesIO()
+        
+        async def write_to_buffer(chunks):
+            buffer.seek(0)
+            buffer.truncate()
+            async for chunk in chunks:
+                buffer.write(chunk)
+        
+        try:
+            if await self._fetch_file(file_url, write_to_buffer, "download_file_content"):
+                return buffer.getvalue()
+            return None
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "download_file_content",
+                "file_url": file_url
+            })
+            return None
+    
+    def _get_cached(self, key: str) -> Optional[List[Dict[str, Any]]]:
+        """Get a cached channel or user list if it has not expired."""
+        cached = self._metadata_cache.get(key)
+        if cached and time.monotonic() - cached[0] < METADATA_CACHE_TTL_SECONDS:
+            return cached[1]
+        return None
+    
+    def _set_cached(self, key: str, items: List[Dict[str, Any]]) -> List[Dict[str, Any]]:
+        """Cache a channel or user list and return it."""
+        self._metadata_cache[key] = (time.monotonic(), items)
+        return items
+    
     async def get_channels(self) -> List[Dict[str, Any]]:
         """Get all channels from Slack."""
+        cached = self._get_cached('channels')
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.client.conversations_list(
+            client = await self._get_client()
+            response = await self._retry(lambda: client.conversations_list(
                 types="public_channel,private_channel",
                 limit=1000
-            )
-            return response.data['channels']
+            ), "conversations_list")
+            return self._set_cached('channels', response.data['channels'])
         except SlackApiError as e:
             self.logger.log_error_with_context(e, {
                 "operation": "get_channels",
@@ -110,9 +243,16 @@ class SlackClient:
     
     async def get_users(self) -> List[Dict[str, Any]]:
         """Get all users from Slack."""
+        cached = self._get_cached('users')
+        if cached is not None:
+            return cached
+        
         try:
-            response = self.client.users_list(limit=1000)
-            return response.data['members']
+            client = await self._get_client()
+            response = await self._retry(
+                lambda: client.users_list(limit=1000), "users_list"
+            )
+            return self._set_cached('users', response.data['members'])
         except SlackApiError as e:
             self.logger.log_error_with_context(e, {
                 "operation": "get_users",
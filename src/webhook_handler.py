@@ -1,13 +1,97 @@
 """Webhook handler for real-time Slack file processing."""
 
+import os
 import json
+import atexit
+import asyncio
 import hmac
-import hashlib
-from typing import Dict, Any, Optional
-from flask import Flask, request, jsonify
+import operator
+import time
+import queue
+import threading
+from collections import OrderedDict
+from datetime import datetime
+import orjson
+from typing import Dict, Any, List, Optional, Set
+from flask import Flask, Response, g, request, jsonify
+from flask.json.provider import JSONProvider
 from src.config import Config
+from src.database import FileRecord
 from src.logger import MigrationLogger
 from src.migration_orchestrator import MigrationOrchestrator
+from src.webhook_fastpath import verify_signature
+
+# Slack signs the request time; older requests are treated as replays
+SIGNATURE_MAX_AGE_SECONDS = 300
+
+# Recently handled event IDs, so Slack's redeliveries are acknowledged
+# without being processed twice
+EVENT_CACHE_SIZE = 65536
+EVENT_CACHE_MAX_AGE_SECONDS = 600
+
+# Shared files accepted but not yet processed, and records not yet saved
+FILE_QUEUE_SIZE = 1024
+
+# New file records are written in batches of up to this many, collected
+# for at most the flush delay after the first one arrives
+RECORD_BATCH_SIZE = 256
+RECORD_FLUSH_DELAY_SECONDS = 0.05
+
+# Fields every shared file must carry to become a file record
+_required_file_fields = operator.itemgetter('id', 'user', 'name', 'timestamp')
+
+# Prebuilt health check response
+HEALTH_PATH = '/health'
+HEALTH_BODY = orjson.dumps({"status": "healthy"})
+HEALTH_HEADERS = [
+    ('Content-Type', 'application/json'),
+    ('Content-Length', str(len(HEALTH_BODY))),
+]
+
+def _health_middleware(wsgi_app):
+    """Answer health probes before Flask builds a request context."""
+    def app(environ, start_response):
+        if environ.get('PATH_INFO') == HEALTH_PATH and environ.get('REQUEST_METHOD') == 'GET':
+            start_response('200 OK', HEALTH_HEADERS)
+            return [HEALTH_BODY]
+        return wsgi_app(environ, start_response)
+    return app
+
+def _serve_with_gunicorn(app: Flask, options: Dict[str, Any]) -> bool:
+    """Serve app with an embedded gunicorn; False if gunicorn is unavailable."""
+    try:
+        from gunicorn.app.base import BaseApplication
+    except ImportError:
+        return False
+    
+    class StandaloneApplication(BaseApplication):
+        """Gunicorn application serving an already-built Flask app."""
+        
+        def load_config(self):
+            for key, value in options.items():
+                self.cfg.set(key, value)
+        
+        def load(self):
+            return app
+    
+    StandaloneApplication().run()
+    return True
+
+class ORJSONProvider(JSONProvider):
+    """Flask JSON provider that serializes with orjson."""
+    
+    def dumps(self, obj: Any, **kwargs: Any) -> str:
+        """Serialize data as a JSON string."""
+        return orjson.dumps(obj).decode()
+    
+    def loads(self, s, **kwargs: Any) -> Any:
+        """Deserialize a JSON string or bytes."""
+        return orjson.loads(s)
+    
+    def response(self, *args: Any, **kwargs: Any) -> Response:
+        """Build a JSON response straight from orjson's bytes output."""
+        obj = self._prepare_response_obj(args, kwargs)
+        return self._app.response_class(orjson.dumps(obj), mimetype='application/json')
 
 class WebhookHandler:
     """Handles real-time webhooks from Slack for new file uploads."""
@@ -16,12 +100,52 @@ class WebhookHandler:
         self.config = config
         self.logger = MigrationLogger("webhook_handler")
         self.app = Flask(__name__)
-        self.orchestrator = MigrationOrchestrator(config)
+        self.app.json = ORJSONProvider(self.app)
+        self.app.wsgi_app = _health_middleware(self.app.wsgi_app)
+        
+        # HMAC keyed once with the webhook secret; each signature check
+        # copies its prepared inner and outer state instead of re-keying
+        secret = config.webhook_secret
+        self._signature_hmac = hmac.new(secret.encode(), digestmod='sha256') if secret else None
+        
+        # event_id -> time handled, oldest first
+        self._seen_events: OrderedDict = OrderedDict()
+        self._seen_events_lock = threading.Lock()
+        
+        # Payload type and event type -> handler
+        self._payload_handlers = {
+            'url_verification': self._handle_url_verification,
+            'event_callback': self._handle_event_callback,
+        }
+        self._event_handlers = {
+            'file_shared': self._handle_file_shared,
+        }
+        
+        # Event filters, fixed by config
+        self._allowed_file_types = frozenset(t.lower() for t in config.file_types)
+        self._max_file_size_bytes = config.max_file_size_mb * 1024 * 1024
+        
+        # Background file processing and the orchestrator, with its
+        # SQLite connection and API clients, are created by _start_worker
+        # in each server process, so they are never inherited across a fork
+        self.orchestrator: Optional[MigrationOrchestrator] = None
+        self._file_slots: Optional[threading.BoundedSemaphore] = None
+        self._record_queue: Optional[queue.Queue] = None
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._migration_slots: Optional[asyncio.Semaphore] = None
+        self._migrating_file_ids: Set[str] = set()  # Only used on the event loop
+        self._worker_pid: Optional[int] = None
         self._setup_routes()
     
     def _setup_routes(self):
         """Set up Flask routes."""
         
+        @self.app.before_request
+        def read_raw_body():
+            # Signature check and payload parsing share one read of the body
+            if request.endpoint == 'handle_slack_webhook':
+                g.raw_body = request.get_data(cache=False)
+        
         @self.app.route(self.config.webhook_endpoint, methods=['POST'])
         def handle_slack_webhook():
             return self._handle_slack_webhook()
@@ -39,20 +163,20 @@ class WebhookHandler:
                 return jsonify({"error": "Invalid signature"}), 403
             
             # Parse webhook payload
-            payload = request.get_json()
+            try:
+                payload = orjson.loads(g.raw_body)
+            except orjson.JSONDecodeError:
+                payload = None
             if not payload:
                 return jsonify({"error": "No payload"}), 400
             
             # Handle different event types
             event_type = payload.get('type')
-            
-            if event_type == 'url_verification':
-                return self._handle_url_verification(payload)
-            elif event_type == 'event_callback':
-                return self._handle_event_callback(payload)
-            else:
+            handler = self._payload_handlers.get(event_type)
+            if handler is None:
                 self.logger.warning(f"Unknown event type: {event_type}")
                 return jsonify({"error": "Unknown event type"}), 400
+            return handler(payload)
                 
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -66,21 +190,14 @@ class WebhookHandler:
             signature = request.headers.get('X-Slack-Signature')
             timestamp = request.headers.get('X-Slack-Request-Timestamp')
             
-            if not signature or not timestamp:
+            if not signature or not timestamp or self._signature_hmac is None:
                 return False
             
-            # Create signature base string
-            body = request.get_data()
-            sig_basestring = f"v0:{timestamp}:{body.decode('utf-8')}"
-            
-            # Create expected signature
-            expected_signature = 'v0=' + hmac.new(
-                self.config.webhook_secret.encode(),
-                sig_basestring.encode(),
-                hashlib.sha256
-            ).hexdigest()
+            # Reject stale requests before doing any hashing
+            if abs(time.time() - int(timestamp)) > SIGNATURE_MAX_AGE_SECONDS:
+                return False
             
-            return hmac.compare_digest(signature, expected_signature)
+            return verify_signature(self._signature_hmac, timestamp, g.raw_body, signature)
             
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -100,14 +217,22 @@ class WebhookHandler:
     def _handle_event_callback(self, payload: Dict[str, Any]) -> Dict[str, str]:
         """Handle Slack event callback."""
         try:
+            # A redelivery of an event already handled is only acknowledged
+            event_id = payload.get('event_id')
+            if event_id and self._is_seen_event(event_id):
+                return jsonify({"status": "ok"})
+            
             event = payload.get('event', {})
-            event_type = event.get('type')
             
-            if event_type == 'file_shared':
-                # Process new file upload
-                file_info = event.get('file', {})
-                self._process_new_file(file_info)
+            # Events without a handler are acknowledged and ignored
+            handler = self._event_handlers.get(event.get('type'))
+            if handler is not None:
+                error_response = handler(event)
+                if error_response is not None:
+                    return error_response
             
+            if event_id:
+                self._remember_event(event_id)
             return jsonify({"status": "ok"})
             
         except Exception as e:
@@ -117,42 +242,162 @@ class WebhookHandler:
             })
             return jsonify({"error": "Failed to process event"}), 500
     
-    def _process_new_file(self, file_info: Dict[str, Any]):
-        """Process a newly uploaded file."""
+    def _is_seen_event(self, event_id: str) -> bool:
+        """Check whether an event was handled within the cache window."""
+        with self._seen_events_lock:
+            handled_at = self._seen_events.get(event_id)
+        return handled_at is not None and time.monotonic() - handled_at <= EVENT_CACHE_MAX_AGE_SECONDS
+    
+    def _remember_event(self, event_id: str):
+        """Record a handled event, dropping expired and excess entries."""
+        now = time.monotonic()
+        with self._seen_events_lock:
+            self._seen_events[event_id] = now
+            self._seen_events.move_to_end(event_id)
+            while self._seen_events and (
+                len(self._seen_events) > EVENT_CACHE_SIZE
+                or now - next(iter(self._seen_events.values())) > EVENT_CACHE_MAX_AGE_SECONDS
+            ):
+                self._seen_events.popitem(last=False)
+    
+    def _handle_file_shared(self, event: Dict[str, Any]):
+        """Queue a shared file; returns an error response if it cannot be."""
+        # Process new file upload after replying, so Slack gets
+        # its answer well inside the 3 second limit
+        file_info = event.get('file') or {}
+        if not self._is_migratable(file_info):
+            return None
+        if not self._enqueue_file(file_info):
+            # Not acknowledged, so Slack redelivers it later
+            return jsonify({"error": "Busy"}), 503
+        return None
+    
+    def _is_migratable(self, file_info: Dict[str, Any]) -> bool:
+        """Check a shared file's type and size against the migration limits."""
+        file_type = (file_info.get('filetype') or '').lower()
+        if file_type not in self._allowed_file_types:
+            self.logger.info(f"Skipping unsupported file type: {file_type}")
+            return False
+        
+        file_size = file_info.get('size') or 0
+        if file_size > self._max_file_size_bytes:
+            self.logger.info(f"File too large: {file_size} bytes")
+            return False
+        return True
+    
+    def _enqueue_file(self, file_info: Dict[str, Any]) -> bool:
+        """Hand a shared file to the event loop for background processing."""
+        # Files are only accepted by a process that can process them
+        if self._worker_pid != os.getpid():
+            raise RuntimeError("Webhook worker was not started in this process")
+        if not self._file_slots.acquire(blocking=False):
+            self.logger.warning("File queue full, deferring event",
+                                file_id=file_info.get('id', 'unknown'))
+            return False
+        asyncio.run_coroutine_threadsafe(self._process_queued_file(file_info), self._loop)
+        return True
+    
+    def _start_worker(self):
+        """Build this server process's orchestrator and background threads.
+        
+        Runs before the process takes requests; errors are raised so that a
+        worker which cannot process files fails to start.
+        """
+        self.orchestrator = MigrationOrchestrator(self.config)
+        self._migrating_file_ids = set()
+        self._file_slots = threading.BoundedSemaphore(FILE_QUEUE_SIZE)
+        self._record_queue = queue.Queue(maxsize=FILE_QUEUE_SIZE)
+        
+        # One long-lived event loop handles every queued file and
+        # migration, so bursts cost coroutines rather than threads
+        # and the orchestrator's pooled Slack session and
+        # semaphores are created once and reused across webhooks
+        self._loop = asyncio.new_event_loop()
+        self._migration_slots = asyncio.Semaphore(self.config.max_concurrent_migrations)
+        threading.Thread(
+            target=self._loop.run_forever,
+            name="webhook-event-loop",
+            daemon=True
+        ).start()
+        atexit.register(self._close_loop, self._loop)
+        
+        threading.Thread(
+            target=self._record_writer,
+            args=(self._record_queue,),
+            name="webhook-record-writer",
+            daemon=True
+        ).start()
+        self._worker_pid = os.getpid()
+    
+    async def _process_queued_file(self, file_info: Dict[str, Any]):
+        """Process a queued file and free its queue slot."""
         try:
-            # Check if file type is supported
-            file_type = file_info.get('filetype', '').lower()
-            if file_type not in self.config.file_types:
-                self.logger.info(f"Skipping unsupported file type: {file_type}")
-                return
-            
-            # Check file size
-            file_size = file_info.get('size', 0)
-            max_size_bytes = self.config.max_file_size_mb * 1024 * 1024
-            if file_size > max_size_bytes:
-                self.logger.info(f"File too large: {file_size} bytes")
+            await self._process_new_file(file_info)
+        finally:
+            self._file_slots.release()
+    
+    def _record_writer(self, record_queue: queue.Queue):
+        """Write queued file records to the database in small batches."""
+        while True:
+            batch = [record_queue.get()]
+            deadline = time.monotonic() + RECORD_FLUSH_DELAY_SECONDS
+            while len(batch) < RECORD_BATCH_SIZE:
+                timeout = deadline - time.monotonic()
+                if timeout <= 0:
+                    break
+                try:
+                    batch.append(record_queue.get(timeout=timeout))
+                except queue.Empty:
+                    break
+            self._write_records(batch)
+    
+    def _write_records(self, file_records: List[FileRecord]):
+        """Save a batch of new file records, then process those still pending."""
+        try:
+            # A file shared twice in one batch is saved and migrated once
+            unique_records = list({
+                record.slack_file_id: record for record in file_records
+            }.values())
+            db = self.orchestrator.db
+            if not db.add_file_records(unique_records):
                 return
             
-            # Create file record
-            from src.database import FileRecord
-            from datetime import datetime
-            
+            # Files already migrated or failed on an earlier share are
+            # left alone
+            pending_ids = db.get_pending_file_ids([record.id for record in unique_records])
+            for file_record in unique_records:
+                if file_record.id in pending_ids:
+                    self._process_file_immediately(file_record)
+        except Exception as e:
+            self.logger.log_error_with_context(e, {
+                "operation": "write_records",
+                "record_count": len(file_records)
+            })
+    
+    async def _process_new_file(self, file_info: Dict[str, Any]):
+        """Process a newly uploaded file."""
+        try:
+            # Type and size were checked before the file was queued
+            file_id, user_id, file_name, timestamp = _required_file_fields(file_info)
+            get = file_info.get
             file_record = FileRecord(
-                id=file_info['id'],
-                slack_file_id=file_info['id'],
-                slack_channel_id=file_info.get('channels', [''])[0],
-                slack_user_id=file_info['user'],
-                file_name=file_info['name'],
-                file_type=file_type,
-                file_size=file_size,
-                upload_timestamp=datetime.fromtimestamp(file_info['timestamp'])
+                id=file_id,
+                slack_file_id=file_id,
+                slack_channel_id=(get('channels') or ('',))[0],
+                slack_user_id=user_id,
+                file_name=file_name,
+                file_type=(get('filetype') or '').lower(),
+                file_size=get('size') or 0,
+                upload_timestamp=datetime.fromtimestamp(timestamp)
             )
             
-            # Save to database
-            self.db.add_file_record(file_record)
-            
-            # Process file immediately
-            self._process_file_immediately(file_record)
+            # Save to database in the writer's next batch, which then
+            # processes the file
+            try:
+                self._record_queue.put_nowait(file_record)
+            except queue.Full:
+                # Wait for the writer to catch up off the event loop
+                await asyncio.to_thread(self._record_queue.put, file_record)
             
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -160,12 +405,11 @@ class WebhookHandler:
                 "file_id": file_info.get('id', 'unknown')
             })
     
-    def _process_file_immediately(self, file_record):
-        """Process a file immediately after upload."""
+    def _process_file_immediately(self, file_record: FileRecord):
+        """Start migrating a file on the event loop without waiting for it."""
         try:
-            # This would implement immediate processing
-            # For now, just log the file
             self.logger.info(f"New file uploaded: {file_record.file_name}")
+            asyncio.run_coroutine_threadsafe(self._migrate_file(file_record), self._loop)
             
         except Exception as e:
             self.logger.log_error_with_context(e, {
@@ -173,11 +417,50 @@ class WebhookHandler:
                 "file_id": file_record.id
             })
     
+    async def _migrate_file(self, file_record: FileRecord):
+        """Migrate a file, bounded by the configured concurrency."""
+        # A file shared again while its migration is still running stays
+        # pending until that migration finishes; only one runs
+        if file_record.id in self._migrating_file_ids:
+            return
+        self._migrating_file_ids.add(file_record.id)
+        try:
+            async with self._migration_slots:
+                if not await self.orchestrator.migrate_file(file_record):
+                    self.logger.warning(f"Immediate migration failed: {file_record.file_name}",
+                                        file_id=file_record.id)
+        finally:
+            self._migrating_file_ids.discard(file_record.id)
+    
+    def _close_loop(self, loop: asyncio.AbstractEventLoop):
+        """Release the orchestrator's connections and stop the event loop."""
+        if not loop.is_running():
+            return
+        try:
+            asyncio.run_coroutine_threadsafe(self.orchestrator.close(), loop).result(timeout=30)
+        except Exception as e:
+            self.logger.log_error_with_context(e, {"operation": "close_loop"})
+        loop.call_soon_threadsafe(loop.stop)
+    
     def run(self):
         """Run the webhook server."""
         self.logger.info(f"Starting webhook server on {self.config.webhook_host}:{self.config.webhook_port}")
-        self.app.run(
-            host=self.config.webhook_host,
-            port=self.config.webhook_port,
-            debug=False
-        )
+        
+        # Threaded workers handle Slack's bursts concurrently; the app is
+        # built before forking, so extra worker processes each inherit it
+        served = _serve_with_gunicorn(self.app, {
+            'bind': f"{self.config.webhook_host}:{self.config.webhook_port}",
+            'workers': self.config.webhook_workers,
+            'worker_class': 'gthread',
+            'threads': self.config.webhook_threads,
+            'post_worker_init': lambda worker: self._start_worker(),
+        })
+        if not served:
+            self.logger.warning("gunicorn unavailable, using the Flask development server")
+            self._start_worker()
+            self.app.run(
+                host=self.config.webhook_host,
+                port=self.config.webhook_port,
+                debug=False,
+                threaded=True
+            )